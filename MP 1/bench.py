@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# bench.py
+# ---------------
+# Benchmarks for the MP1 search algorithms.
+#
+# `scaling` upscales existing mazes by a sequence of integer factors (every cell
+# becomes a `factor x factor` block) and times a solver on each copy; with O(1)
+# frontier and visited bookkeeping the time per explored state should stay flat as
+# the maze grows.
+#
+# `sweep` procedurally generates mazes over a grid of sizes, obstacle densities and
+# waypoint counts, runs every solver on each one in a fresh process (see
+# grade.run_case) and prints the results as JSON, for comparison across commits.
+
+import argparse, itertools, json, os, subprocess, tempfile, time
+from collections import deque
+
+import numpy as np
+
+import grade
+import maze
+import search
+
+def upscale(path, factor, legend = {'wall': '%', 'start': 'P', 'waypoint': '.'}):
+    """Returns the rows of the maze at `path`, with every cell repeated into a
+    `factor x factor` block. Only the top-left cell of a start or waypoint block
+    keeps its marker, the rest of the block is left open."""
+    with open(path) as file:
+        lines = tuple(line.strip() for line in file.readlines() if line.strip())
+
+    rows = []
+    for line in lines:
+        for r in range(factor):
+            row = []
+            for x in line:
+                if x == legend['wall']:
+                    row.append(x * factor)
+                elif r == 0 and x in (legend['start'], legend['waypoint']):
+                    row.append(x + ' ' * (factor - 1))
+                else:
+                    row.append(' ' * factor)
+            rows.append(''.join(row))
+    return rows
+
+def scaling(path, solution, factors):
+    """Times `solution` on upscaled copies of the maze at `path`"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for factor in factors:
+            filepath = os.path.join(directory, '{0}-x{1}'.format(os.path.basename(path), factor))
+            with open(filepath, 'w') as file:
+                file.write('\n'.join(upscale(path, factor)))
+
+            instance    = maze.Maze(filepath)
+            time_start  = time.perf_counter()
+            z           = getattr(search, solution)(instance)
+            time_total  = time.perf_counter() - time_start
+
+            results.append({
+                'factor'            : factor,
+                'cells'             : instance.size.x * instance.size.y,
+                'path length'       : len(z),
+                'states explored'   : instance.states_explored,
+                'time'              : time_total,
+                'time per state'    : time_total / max(1, instance.states_explored),
+            })
+    return results
+
+def generate(size, density, waypoints, seed = 0, legend = {'wall': '%', 'start': 'P', 'waypoint': '.'}):
+    """
+    Returns the rows of a random `size x size` maze, including its border. Interior
+    cells are walls with probability `density`; the start and `waypoints` waypoints
+    are placed on distinct cells reachable from each other.
+    """
+    rng     = np.random.default_rng(seed)
+    grid    = np.where(rng.random((size, size)) < density, ord(legend['wall']), ord(' ')).astype(np.uint8)
+    grid[[0, -1], :] = grid[:, [0, -1]] = ord(legend['wall'])
+
+    # restrict the start and waypoints to the open region reachable from a random open cell
+    free    = np.flatnonzero(grid.ravel() != ord(legend['wall']))
+    if len(free) == 0:
+        raise ValueError('maze of size {0} and density {1} has no open cells'.format(size, density))
+    source  = int(rng.choice(free))
+    flat    = grid.ravel()
+    seen    = bytearray(size * size)
+    seen[source] = 1
+    queue   = deque((source,))
+    region  = []
+    while queue:
+        curr = queue.popleft()
+        region.append(curr)
+        for neighbor in (curr + size, curr - size, curr + 1, curr - 1):
+            if not seen[neighbor] and flat[neighbor] != ord(legend['wall']):
+                seen[neighbor] = 1
+                queue.append(neighbor)
+    if len(region) < waypoints + 1:
+        raise ValueError('maze of size {0} and density {1} has too few reachable cells'.format(size, density))
+
+    cells   = rng.choice(len(region), size = waypoints + 1, replace = False)
+    flat[region[cells[0]]]  = ord(legend['start'])
+    for cell in cells[1:]:
+        flat[region[cell]]  = ord(legend['waypoint'])
+    return [row.tobytes().decode() for row in grid]
+
+def sweep(sizes, densities, waypoints, solutions, limit = 60, seed = 0):
+    """
+    Runs every solution on a generated maze for every combination of size, density
+    and waypoint count. Single-objective solutions only run on single-waypoint mazes.
+
+    @return a list of result dictionaries
+    """
+    single  = ('bfs', 'astar_single', 'astar_corridor', 'jps', 'hpa')
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size, density, count in itertools.product(sizes, densities, waypoints):
+            filepath = os.path.join(directory, 'maze-{0}-{1}-{2}'.format(size, density, count))
+            with open(filepath, 'w') as file:
+                file.write('\n'.join(generate(size, density, count, seed)))
+
+            for solution in solutions:
+                if solution in single and count != 1:
+                    continue
+                # one case at a time in a fresh process, so timings and peak RSS don't interfere
+                outcome = grade.run_case_isolated((solution, filepath, limit))
+                results.append({
+                    'solution'          : solution,
+                    'size'              : size,
+                    'cells'             : size * size,
+                    'density'           : density,
+                    'waypoints'         : count,
+                    'path_length'       : outcome['length'],
+                    'states_explored'   : outcome['states_explored'],
+                    'error'             : outcome['error'] or outcome['validity'],
+                    'wall'              : outcome['timing']['wall'],
+                    'solve'             : outcome['timing'].get('solve'),
+                    'peak_rss_kb'       : outcome['timing']['peak_rss_kb'],
+                })
+    return results
+
+def revision():
+    """Returns the current git commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(('git', 'rev-parse', 'HEAD'), capture_output = True, text = True,
+            check = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description     = 'CS440 MP1 search benchmarks',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    scaling_parser = commands.add_parser('scaling', help = 'time one solver on upscaled copies of existing mazes',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    scaling_parser.add_argument('paths', nargs = '*', default = ('data/part-1/open', 'data/part-1/no_obs'),
+                        help = 'paths to maze files')
+    scaling_parser.add_argument('--search', dest = 'search', type = str, default = 'bfs',
+                        choices = ('bfs', 'astar_single', 'astar_corridor', 'jps', 'hpa'),
+                        help = 'search method')
+    scaling_parser.add_argument('--factors', dest = 'factors', type = int, nargs = '+', default = (1, 2, 4, 8, 16, 32),
+                        help = 'upscaling factors')
+
+    sweep_parser = commands.add_parser('sweep', help = 'run every solver on generated mazes and print JSON',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    sweep_parser.add_argument('--sizes', dest = 'sizes', type = int, nargs = '+', default = (32, 100, 316, 1000),
+                        help = 'maze side lengths')
+    sweep_parser.add_argument('--densities', dest = 'densities', type = float, nargs = '+', default = (0.0, 0.2, 0.35),
+                        help = 'fraction of interior cells that are walls')
+    sweep_parser.add_argument('--waypoints', dest = 'waypoints', type = int, nargs = '+', default = (1, 4, 8),
+                        help = 'waypoint counts')
+    sweep_parser.add_argument('--search', dest = 'solutions', type = str, nargs = '+',
+                        default = ('bfs', 'astar_single', 'astar_multiple', 'fast'),
+                        help = 'search methods')
+    sweep_parser.add_argument('--timeout', dest = 'timeout', type = float, default = 60,
+                        help = 'wall-clock limit in seconds for each case')
+    sweep_parser.add_argument('--seed', dest = 'seed', type = int, default = 0,
+                        help = 'maze generation seed')
+    sweep_parser.add_argument('--output', dest = 'output', type = str, default = None,
+                        help = 'write JSON to this file instead of stdout')
+
+    arguments   = parser.parse_args()
+    if arguments.command == 'sweep':
+        results = {
+            'revision'  : revision(),
+            'results'   : sweep(arguments.sizes, arguments.densities, arguments.waypoints,
+                arguments.solutions, arguments.timeout, arguments.seed),
+        }
+        if arguments.output is None:
+            print(json.dumps(results, indent = 4))
+        else:
+            with open(arguments.output, 'w') as file:
+                file.write(json.dumps(results, indent = 4))
+        raise SystemExit
+
+    for path in arguments.paths:
+        print('{0} ({1})'.format(path, arguments.search))
+        print('{0:>8} {1:>10} {2:>12} {3:>10} {4:>16}'.format(
+            'factor', 'cells', 'explored', 'time (s)', 'time/state (us)'))
+        for result in scaling(path, arguments.search, arguments.factors):
+            print('{0:>8} {1:>10} {2:>12} {3:>10.4f} {4:>16.3f}'.format(
+                result['factor'], result['cells'], result['states explored'],
+                result['time'], 1e6 * result['time per state']))
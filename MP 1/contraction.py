@@ -0,0 +1,127 @@
+# contraction.py
+# ---------------
+# Contracts a maze into a weighted graph. Navigable cells with exactly two navigable
+# neighbors are corridor cells; every other navigable cell (junctions and dead ends),
+# along with the start and the waypoints, becomes a node. Each maximal run of corridor
+# cells between two nodes becomes one edge, weighted by its length in moves.
+#
+# Searching the contracted graph expands one state per node instead of one per cell,
+# and edges are expanded back into cell paths afterwards.
+
+import heapq
+from array import array
+
+import numpy as np
+
+def degrees(maze):
+    """Returns the number of navigable neighbors of every cell, as a flat uint8 array"""
+    masks   = np.frombuffer(maze.adjacency, dtype = np.uint8)
+    degree  = np.zeros(len(masks), dtype = np.uint8)
+    for bit in range(4):
+        degree += (masks >> bit) & 1
+    return degree
+
+def corridor_ratio(maze):
+    """Returns the fraction of the navigable cells of `maze` that are corridor cells"""
+    navigable = (maze.grid != ord(maze.legend.wall)).ravel()
+    return np.count_nonzero(navigable & (degrees(maze) == 2)) / max(1, np.count_nonzero(navigable))
+
+class CorridorGraph:
+    """
+    Weighted graph of the junctions, dead ends, start and waypoints of `maze`.
+
+    `nodes[u]` is the flat cell index of node u, and `edges[u]` lists tuples
+    (v, length, corridor, forward), where `corridors[corridor]` holds the flat
+    indices of the corridor cells strictly between the two nodes, ordered from u
+    to v if `forward` is true and from v to u otherwise.
+    """
+    def __init__(self, maze):
+        self.maze   = maze
+        width       = maze.size.x
+        navigable   = (maze.grid != ord(maze.legend.wall)).ravel()
+        is_node     = navigable & (degrees(maze) != 2)
+        for x in (maze.start,) + tuple(maze.waypoints):
+            is_node[maze.index( * x )] = True
+
+        self.nodes      = np.flatnonzero(is_node).tolist()
+        self.node_of    = {x: u for u, x in enumerate(self.nodes)}
+        self.edges      = [[] for _ in self.nodes]
+        self.corridors  = []
+
+        offsets = (width, -width, 1, -1)
+        adjacency = maze.adjacency
+        for u, x in enumerate(self.nodes):
+            for bit, offset in enumerate(offsets):
+                if not adjacency[x] >> bit & 1:
+                    continue
+                # follow the corridor until it reaches another node
+                prev, curr = x, x + offset
+                cells = array('i')
+                while not is_node[curr]:
+                    cells.append(curr)
+                    mask = adjacency[curr]
+                    for b, o in enumerate(offsets):
+                        if mask >> b & 1 and curr + o != prev:
+                            prev, curr = curr, curr + o
+                            break
+                v = self.node_of[curr]
+                # every corridor is walked once from each end; keep only one of the walks
+                if u == v or (u, cells[0] if cells else v) > (v, cells[-1] if cells else u):
+                    continue
+                self.edges[u].append((v, len(cells) + 1, len(self.corridors), True))
+                self.edges[v].append((u, len(cells) + 1, len(self.corridors), False))
+                self.corridors.append(cells)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def expand(self, u, edge):
+        """Returns the flat indices of the cells along `edge` out of node u, excluding u"""
+        v, _, corridor, forward = edge
+        cells = self.corridors[corridor]
+        return (cells.tolist() if forward else cells[::-1].tolist()) + [self.nodes[v]]
+
+    def astar(self, source, target):
+        """
+        Runs A* over the contracted graph from cell `source` to cell `target`, both
+        of which must be nodes (e.g. the start and a waypoint). Expanding a node
+        counts as one explored state in the maze.
+
+        @return path: a list of (row, col) tuples from source to target, or [] if
+            target cannot be reached
+        """
+        maze = self.maze
+        source, target = self.node_of[maze.index( * source )], self.node_of[maze.index( * target )]
+        ti, tj = maze.cell(self.nodes[target])
+
+        def heuristic(u):
+            i, j = maze.cell(self.nodes[u])
+            return abs(i - ti) + abs(j - tj)
+
+        g = {source: 0}
+        prev = {source: None}
+        queue = [(heuristic(source), 0, source)]
+        while queue:
+            _, curr_g, curr = heapq.heappop(queue)
+            if curr_g > g[curr]:
+                continue
+            if curr == target:
+                break
+            maze.states_explored += 1
+            for edge in self.edges[curr]:
+                v, length = edge[0], edge[1]
+                if curr_g + length < g.get(v, curr_g + length + 1):
+                    g[v] = curr_g + length
+                    prev[v] = (curr, edge)
+                    heapq.heappush(queue, (g[v] + heuristic(v), g[v], v))
+        else:
+            return []
+
+        legs = []
+        while prev[curr] is not None:
+            curr, edge = prev[curr]
+            legs.append(self.expand(curr, edge))
+        path = [self.nodes[source]]
+        for leg in reversed(legs):
+            path.extend(leg)
+        return [maze.cell(x) for x in path]
@@ -0,0 +1,270 @@
+# distances.py
+# ---------------
+# Exact shortest-path distances between the start and the waypoints of a maze.
+#
+# Distance fields from the start and from every waypoint are computed with a 
+# vectorized BFS (`wavefront`) that expands whole frontiers at once as NumPy index
+# arrays, giving an all-pairs distance matrix plus the shortest path for every pair,
+# which the multi-goal solvers stitch back together into a full cell path. The fields
+# are computed in chunks spread over a process pool when there are many waypoints, and 
+# the result is cached on disk keyed by a hash of the maze, so repeat runs skip it. The
+# cache lives in the user's cache directory and is kept under CACHE_BYTES by evicting
+# the least recently used entries.
+
+import hashlib, math, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# field computations are farmed out to a process pool at or above this many sources
+PARALLEL_THRESHOLD  = 16
+# at most this many cells of distance fields (and their parents) are held in memory at once
+FIELD_CELLS         = 1 << 24
+# bump whenever the saved layout changes so stale cache files are ignored
+CACHE_VERSION       = 3
+# the cache directory is pruned to at most this many bytes after every save
+CACHE_BYTES         = 1 << 30
+
+def cache_directory():
+    """Returns the default directory of the distance cache: `mp1` under $XDG_CACHE_HOME,
+    or under ~/.cache if it is not set"""
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'mp1')
+
+def prune(directory, limit = CACHE_BYTES):
+    """Deletes the least recently used files of `directory` until their total size is at most `limit`"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+        entries = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries), reverse = True)
+    except OSError:
+        return
+    total = 0
+    for _, size, path in entries:
+        total += size
+        if total > limit:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def maze_hash(maze):
+    """Returns a hex digest identifying the contents of `maze`"""
+    digest = hashlib.sha1('{0}x{1}:'.format(maze.size.y, maze.size.x).encode())
+    digest.update(maze.grid.tobytes())
+    return digest.hexdigest()
+
+def pool_workers(workers):
+    """
+    Returns the number of processes to spread work over given the caller's `workers`
+    (None for the number of CPUs): 1 inside a daemonic process, such as a
+    multiprocessing.Pool worker, since those cannot start processes of their own.
+    """
+    return 1 if multiprocessing.current_process().daemon else workers
+
+def wavefront(adjacency, width, sources, parents = False, shared = False):
+    """
+    Runs a BFS from each of the flat cell indices in `sources` at the same time, over a
+    maze's adjacency table and row width. Each step expands the whole frontier of every
+    source at once.
+
+    @param shared: if true, all sources grow a single field together, giving each cell
+        its distance to the nearest source
+
+    @return field: a (len(sources), len(adjacency)) int32 array, where field[s, x] is the
+        distance from sources[s] to cell x, or -1 if x cannot be reached from it (a
+        (1, len(adjacency)) array if `shared`); if `parents` is true, also an array of
+        the same shape holding the cell each cell was first reached from
+    """
+    masks = np.frombuffer(adjacency, dtype = np.uint8)
+    size = len(masks)
+    fields = 1 if shared else len(sources)
+    field = np.full(fields * size, -1, dtype = np.int32)
+    parent = np.full(fields * size, -1, dtype = np.int32) if parents else None
+    # cells of the k-th field are offset by k * size, moves never cross fields since 
+    # maze borders are walls
+    index = np.int32 if fields * size < 1 << 31 else np.int64
+    frontier = np.asarray(sources, dtype = index)
+    if not shared:
+        frontier = frontier + np.arange(len(sources), dtype = index) * size
+    field[frontier] = 0
+
+    distance = 0
+    while len(frontier):
+        distance += 1
+        open_ = masks[frontier % size if fields > 1 else frontier]
+        moves = tuple((open_ >> bit) & 1 == 1 for bit in range(4))
+        reached = np.concatenate(tuple(frontier[move] + offset 
+            for move, offset in zip(moves, (width, -width, 1, -1))))
+        new = field[reached] < 0
+        reached = reached[new]
+        # a cell reached from several frontier cells keeps exactly one of them: tag each
+        # write with its position and keep the positions whose tag survived
+        tags = -2 - np.arange(len(reached), dtype = np.int32)
+        field[reached] = tags
+        kept = field[reached] == tags
+        if parents:
+            origins = np.concatenate(tuple(frontier[move] for move in moves))[new][kept]
+        frontier = reached[kept]
+        field[frontier] = distance
+        if parents:
+            parent[frontier] = origins % size
+    field = field.reshape(fields, size)
+    return (field, parent.reshape(fields, size)) if parents else field
+
+def distance_fields(maze, cells = None):
+    """
+    Returns a (len(cells), rows, columns) int32 array with the distance from each of 
+    `cells` (the maze's waypoints if not given) to every maze cell, or -1 where a cell
+    cannot be reached.
+    """
+    if cells is None:
+        cells = maze.waypoints
+    sources = [maze.index( * x ) for x in cells]
+    return wavefront(maze.adjacency, maze.size.x, sources).reshape(len(sources), maze.size.y, maze.size.x)
+
+def from_sources(adjacency, width, sources, start, stop):
+    """
+    Computes the distance fields of sources[start:stop] in one wavefront, then reads
+    off the distance and shortest path from each of those sources to every source 
+    after it.
+
+    @return a list with, for each source i in range(start, stop), a tuple (distances, 
+        paths) covering sources[i + 1:], where unreachable sources have distance -1 
+        and path None
+    """
+    fields, parents = wavefront(adjacency, width, sources[start:stop], parents = True)
+    results = []
+    for i, field, parent in zip(range(start, stop), fields, parents):
+        # plain lists index much faster than numpy arrays, one element at a time
+        parent = parent.tolist()
+        distances = []
+        paths = []
+        for target in sources[i + 1:]:
+            distances.append(int(field[target]))
+            if field[target] < 0:
+                paths.append(None)
+                continue
+            path = [target]
+            for _ in range(distances[-1]):
+                path.append(parent[path[-1]])
+            path.reverse()
+            paths.append(np.array(path, dtype = np.int32))
+        results.append((distances, paths))
+    return results
+
+# process pool workers receive the adjacency table once, through the initializer
+_worker_maze = None
+
+def _initialize_worker(adjacency, width):
+    global _worker_maze
+    _worker_maze = (adjacency, width)
+
+def _from_sources_worker(args):
+    return from_sources( * _worker_maze , * args )
+
+class WaypointDistances:
+    """
+    All-pairs shortest paths between the start (index 0) and the waypoints
+    (indices 1 through len(maze.waypoints)) of a maze.
+
+    `distances[i, j]` is the shortest path length between cells i and j, or -1 if
+    j cannot be reached from i. The precomputation reads the maze's adjacency table
+    directly, so it does not count toward `maze.states_explored`. `cache` is the
+    directory the result is cached in, True for cache_directory(), or None to not
+    cache it.
+    """
+    def __init__(self, maze, workers = None, cache = True):
+        self.maze   = maze
+        self.cells  = (maze.start,) + tuple(maze.waypoints)
+
+        if cache is True:
+            cache = cache_directory()
+        path = None if cache is None else os.path.join(cache,
+            'distances-{0}.npz'.format(maze_hash(maze)))
+        if path is not None and self._load(path):
+            return
+
+        self._compute(workers)
+        if path is not None:
+            self._save(path)
+
+    def _compute(self, workers):
+        sources = tuple(self.maze.index( * x ) for x in self.cells)
+        workers = pool_workers(workers)
+        parallel = len(sources) >= PARALLEL_THRESHOLD and workers != 1
+        # source i only needs paths to sources after it, the rest are reversed copies;
+        # split the sources into chunks whose fields fit in memory (and across workers)
+        chunk   = max(1, FIELD_CELLS // len(self.maze.adjacency))
+        if parallel:
+            chunk = min(chunk, math.ceil((len(sources) - 1) / (workers or os.cpu_count() or 1)))
+        jobs    = tuple((sources, start, min(start + chunk, len(sources) - 1))
+            for start in range(0, len(sources) - 1, chunk))
+
+        if parallel:
+            with ProcessPoolExecutor(max_workers = workers, initializer = _initialize_worker,
+                    initargs = (self.maze.adjacency, self.maze.size.x)) as pool:
+                results = tuple(result for results in pool.map(_from_sources_worker, jobs) 
+                    for result in results)
+        else:
+            results = tuple(result for job in jobs 
+                for result in from_sources(self.maze.adjacency, self.maze.size.x, * job ))
+
+        n = len(sources)
+        self.distances  = np.zeros((n, n), dtype = np.int64)
+        self._paths     = {}
+        for i, (distances, paths) in enumerate(results):
+            for j, distance, path in zip(range(i + 1, n), distances, paths):
+                self.distances[i, j] = self.distances[j, i] = distance
+                self._paths[i, j] = path
+
+    def _load(self, path):
+        try:
+            with np.load(path, allow_pickle = False) as data:
+                if int(data['version']) != CACHE_VERSION or data['cells'].tolist() != [list(x) for x in self.cells]:
+                    return False
+                self.distances, lengths, cells = data['distances'], data['lengths'], data['paths']
+            # mark the entry as recently used
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return False
+        # the paths of the pairs i < j in row-major order, concatenated; unreachable pairs have length -1
+        pairs   = zip( * np.triu_indices(len(self.cells), 1) )
+        ends    = np.cumsum(np.maximum(lengths, 0))
+        self._paths = {(int(i), int(j)): None if length < 0 else cells[end - length:end]
+            for (i, j), length, end in zip(pairs, lengths.tolist(), ends.tolist())}
+        return True
+
+    def _save(self, path):
+        pairs   = zip( * np.triu_indices(len(self.cells), 1) )
+        paths   = [self._paths[int(i), int(j)] for i, j in pairs]
+        lengths = np.array([-1 if p is None else len(p) for p in paths], dtype = np.int64)
+        cells   = np.concatenate([p for p in paths if p is not None] + [np.zeros(0, dtype = np.int32)])
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            # write to a temporary file first so concurrent runs never read a partial cache
+            with open(path + '.{0}.tmp'.format(os.getpid()), 'wb') as file:
+                np.savez(file, version = CACHE_VERSION, cells = np.array(self.cells, dtype = np.int64).reshape(-1, 2),
+                    distances = self.distances, lengths = lengths, paths = cells)
+            os.replace(path + '.{0}.tmp'.format(os.getpid()), path)
+        except OSError:
+            return
+        prune(os.path.dirname(path))
+
+    def __len__(self):
+        return len(self.cells)
+
+    def path(self, i, j):
+        """Returns the shortest path from cell i to cell j as a list of flat cell indices"""
+        if i == j:
+            return [self.maze.index( * self.cells[i] )]
+        path = self._paths[min(i, j), max(i, j)]
+        if path is None:
+            raise ValueError('cell {0} cannot be reached from cell {1}'.format(j, i))
+        return path.tolist() if i < j else path[::-1].tolist()
+
+    def stitch(self, order):
+        """Joins the shortest paths between consecutive indices in `order` into a
+        single list of (row, col) tuples"""
+        path = self.path(order[0], order[0])
+        for i, j in zip(order, order[1:]):
+            path.extend(self.path(i, j)[1:])
+        return [self.maze.cell(x) for x in path]
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-import pprint, argparse, pickle, json
+import pprint, argparse, hashlib, inspect, os, pickle, json, multiprocessing, resource, signal, sys, time
+from concurrent.futures import ThreadPoolExecutor
 
 import maze 
 
@@ -32,6 +33,12 @@ if __name__ == "__main__":
 
     parser.add_argument('--gradescope', default = False, action = 'store_true',
                         help = 'save output in gradescope-readable json file')
+    parser.add_argument('--workers', dest = 'workers', type = int, default = None,
+                        help = 'number of worker processes (defaults to the number of cpus)')
+    parser.add_argument('--timeout', dest = 'timeout', type = float, default = 60,
+                        help = 'wall-clock limit in seconds for each case')
+    parser.add_argument('--generate', default = False, action = 'store_true',
+                        help = 'regenerate the answer keys before grading')
 
     arguments   = parser.parse_args()
     
@@ -46,14 +53,93 @@ if __name__ == "__main__":
             print(message)
         raise SystemExit
 
-def generate_answer_key(path, mazes, solutions):
-    key_instructor  = tuple({case: (getattr(search, solution)(maze), maze.states_explored)
-        for case, maze in mazes.items()}
+# solved answer key cases, content-addressed by maze, solution and solver sources
+KEY_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'keys')
+
+def source_hash( * modules ):
+    """
+    Returns a hex digest of the source of `modules` and of every module in the same 
+    directory that they use, directly or indirectly, so it changes whenever any code
+    the modules could run changes.
+    """
+    directory = os.path.dirname(os.path.abspath(modules[0].__file__))
+    seen = {}
+    pending = list(modules)
+    while pending:
+        module = pending.pop()
+        if module.__name__ in seen:
+            continue
+        with open(module.__file__, 'rb') as file:
+            seen[module.__name__] = file.read()
+        for value in vars(module).values():
+            used = value if inspect.ismodule(value) else sys.modules.get(getattr(value, '__module__', None))
+            if (used is not None and getattr(used, '__file__', None) 
+                    and os.path.dirname(os.path.abspath(used.__file__)) == directory):
+                pending.append(used)
+    
+    digest = hashlib.sha1()
+    for name in sorted(seen):
+        digest.update('{0}:{1}:'.format(name, len(seen[name])).encode())
+        digest.update(seen[name])
+    return digest.hexdigest()
+
+def solve_case(task):
+    """Solves one maze with a reference solution, returning its path and states explored"""
+    solution, filepath = task
+    import search 
+    
+    instance = maze.Maze(filepath)
+    return getattr(search, solution)(instance), instance.states_explored
+
+def generate_answer_key(path, mazes, solutions, workers = None, cache = KEY_CACHE):
+    """
+    Solves every case with the reference solutions and pickles the instructor key 
+    (paths) and the student key (path lengths). Solved cases are cached in `cache` under
+    the hash of the maze file, the solution name and the solver sources, so only cases
+    whose maze or solver changed since the last run are solved again, in parallel over
+    `workers` processes.
+    """
+    import search 
+    
+    version = source_hash(search, maze)
+    entries = {}
+    for mazes_, solution in zip(mazes, solutions):
+        for filepath in mazes_.values():
+            with open(filepath, 'rb') as file:
+                digest = hashlib.sha1(file.read())
+            digest.update('{0}:{1}'.format(solution, version).encode())
+            entries[solution, filepath] = os.path.join(cache, '{0}.pickle'.format(digest.hexdigest()))
+    
+    solved = {}
+    for task, entry in entries.items():
+        try:
+            with open(entry, 'rb') as file:
+                solved[task] = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+    
+    missing = tuple(task for task in entries if task not in solved)
+    if missing:
+        with multiprocessing.Pool(workers) as pool:
+            for task, result in zip(missing, pool.map(solve_case, missing, chunksize = 1)):
+                solved[task] = result
+                try:
+                    os.makedirs(cache, exist_ok = True)
+                    # write to a temporary file first so concurrent runs never read a partial entry
+                    with open(entries[task] + '.{0}.tmp'.format(os.getpid()), 'wb') as file:
+                        pickle.dump(result, file)
+                    os.replace(entries[task] + '.{0}.tmp'.format(os.getpid()), entries[task])
+                except OSError:
+                    pass
+    
+    key_instructor  = tuple({case: solved[solution, filepath]
+        for case, filepath in mazes.items()}
         for mazes, solution in zip(mazes, solutions))
     key_student     = tuple({case: (len(sol[0]), sol[1]) for case, sol in part.items()} 
         for part in key_instructor)
     pickle.dump(key_instructor, open(path['instructor'], 'wb'))
     pickle.dump(key_student,    open(path['student'],    'wb'))
+    return len(missing)
 
 def load_answer_key(path):
     try:
@@ -62,19 +148,122 @@ def load_answer_key(path):
         print('running in student mode (instructor key unavailable)')
         return pickle.load(open(path['student'],    'rb'))
 
-def grade_optimal(name, key, mazes, solution, weight = 1):
-    def grade(case, maze):
+# a BaseException, so a solver's `except Exception` cannot swallow it
+class CaseTimeout(BaseException):
+    pass
+
+# seconds past its limit a case process gets to report before it is killed, e.g. when
+# the solver is stuck in C code and never sees the alarm
+CASE_GRACE = 5
+
+def _alarm(signum, frame):
+    raise CaseTimeout
+
+def run_case(task):
+    """
+    Loads, solves and validates one maze under a wall-clock limit. Runs in its own 
+    worker process, so the peak RSS reported is that of this case alone.
+    """
+    solution, filepath, limit = task
+    import search 
+    
+    outcome = {'length': None, 'states_explored': None, 'validity': None, 'error': None}
+    timing  = {}
+    signal.signal(signal.SIGALRM, _alarm)
+    signal.setitimer(signal.ITIMER_REAL, limit)
+    time_start = time.perf_counter()
+    try:
+        instance            = maze.Maze(filepath)
+        timing['load']      = time.perf_counter() - time_start
+        z                   = getattr(search, solution)(instance)
+        timing['solve']     = time.perf_counter() - time_start - timing['load']
+        outcome['validity'] = instance.validate_path(z)
+        timing['validate']  = time.perf_counter() - time_start - timing['load'] - timing['solve']
+        outcome['length']           = len(z)
+        outcome['states_explored']  = instance.states_explored
+    except CaseTimeout:
+        outcome['error']    = 'timed out after {0} seconds'.format(limit)
+    except Exception as error:
+        outcome['error']    = '{0}: {1}'.format(type(error).__name__, error)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    
+    timing['wall']          = time.perf_counter() - time_start
+    timing['peak_rss_kb']   = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    outcome['timing']       = timing
+    return outcome
+
+def _run_case_process(task, connection):
+    connection.send(run_case(task))
+    connection.close()
+
+def run_case_isolated(task):
+    """
+    Runs run_case in a fresh process and returns its outcome. Unlike the workers of a
+    multiprocessing.Pool, the process is not daemonic, so solvers can start process
+    pools of their own. A process that has not reported CASE_GRACE seconds after the
+    case's limit is killed, and the case counts as timed out.
+    """
+    _, _, limit = task
+    receiver, sender = multiprocessing.Pipe(duplex = False)
+    process = multiprocessing.Process(target = _run_case_process, args = (task, sender))
+    time_start = time.perf_counter()
+    process.start()
+    sender.close()
+    outcome = timed_out = None
+    try:
+        if receiver.poll(limit + CASE_GRACE):
+            outcome = receiver.recv()
+        else:
+            timed_out = True
+    except EOFError:
+        pass
+    receiver.close()
+    if timed_out:
+        process.terminate()
+        process.join(CASE_GRACE)
+        if process.is_alive():
+            process.kill()
+    process.join()
+    if outcome is None:
+        if timed_out:
+            error = 'timed out after {0} seconds'.format(limit)
+        else:
+            # the process died before sending an outcome, e.g. killed for running out of memory
+            error = 'case process exited with code {0}'.format(process.exitcode)
+        outcome = {'length': None, 'states_explored': None, 'validity': None, 'error': error,
+            'timing': {'wall': time.perf_counter() - time_start, 'peak_rss_kb': None}}
+    return outcome
+
+def run_cases(mazes, solutions, workers = None, limit = 60):
+    """
+    Runs every case of every part in a fresh process per case, `workers` at a time.
+    
+    @return a tuple with a dictionary of case outcomes for each part
+    """
+    tasks = tuple((part, case, (solution, filepath, limit)) 
+        for part, (mazes, solution) in enumerate(zip(mazes, solutions)) 
+        for case, filepath in mazes.items())
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        results = tuple(pool.map(run_case_isolated, tuple(task for _, _, task in tasks)))
+    
+    outcomes = tuple({} for _ in mazes)
+    for (part, case, _), outcome in zip(tasks, results):
+        outcomes[part][case] = outcome
+    return outcomes
+
+def grade_optimal(name, key, outcomes, weight = 1):
+    def grade(case, outcome):
         path, states_explored = key[case]
-        z = getattr(search, solution)(maze)
         # check that the path is valid 
-        ret_valid = maze.validate_path(z)
+        ret_valid = outcome['error'] or outcome['validity']
         score_validity  = int(ret_valid is None)
         # check that the length of the student’s path matches 
         true_len = (path if type(path) is int else len(path))
         if score_validity:
-            score_length    = int(len(z) == true_len)
+            score_length    = int(outcome['length'] == true_len)
             # check that student explores at most 10% more states than solution
-            score_explored = maze.states_explored < 1.1 * states_explored
+            score_explored = outcome['states_explored'] < 1.1 * states_explored
         else:
             score_length = 0
             score_explored = 0
@@ -84,39 +273,41 @@ def grade_optimal(name, key, mazes, solution, weight = 1):
                 'output'    : 'Your path is valid' if score_validity else "Your path is not valid, error: {}".format(ret_valid),
                 'score'     : 2 * weight * score_validity,
                 'max_score' : 2 * weight,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
             {
                 'name'      : '{0}: not too many states explored for \'{1}\' maze'.format(name, case),
-                'output'    : 'You explored {} states, you should explore fewer than 1.1 * {}'.format(maze.states_explored, states_explored),
+                'output'    : 'You explored {} states, you should explore fewer than 1.1 * {}'.format(outcome['states_explored'], states_explored),
                 'score'     : weight * score_explored,
                 'max_score' : weight,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
             {
                 'name'      : '{0}: correct path length for \'{1}\' maze'.format(name, case),
-                'output'    : 'Your path length is {}, the correct length is {}'.format(len(z), true_len),
+                'output'    : 'Your path length is {}, the correct length is {}'.format(outcome['length'], true_len),
                 'score'     : 2 * weight * score_length,
                 'max_score' : 2 * weight,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
         )
             
-    return tuple(item for case, maze in mazes.items() for item in grade(case, maze))
+    return tuple(item for case, outcome in outcomes.items() for item in grade(case, outcome))
 
-def grade_suboptimal(name, key, mazes, solution):
-    def grade(case, maze):
+def grade_suboptimal(name, key, outcomes):
+    def grade(case, outcome):
         path, states_explored = key[case]
-        z = getattr(search, solution)(maze)
         # check that the path is valid 
-        ret_valid = maze.validate_path(z)
+        ret_valid = outcome['error'] or outcome['validity']
         score_validity  = int(ret_valid is None)
         # check that the path length isn't too bad 
         sol_len = (path if type(path) is int else len(path))
         if score_validity:
-            score_length    = ( len(z)  < 1.2 * sol_len )
+            score_length    = ( outcome['length']  < 1.2 * sol_len )
             
-            score_explored = maze.states_explored < 1.2 * states_explored
+            score_explored = outcome['states_explored'] < 1.2 * states_explored
         else:
             score_length    = 0
             score_explored = 0
@@ -127,25 +318,28 @@ def grade_suboptimal(name, key, mazes, solution):
                 'output'    : 'Your path is valid' if score_validity else "Your path is not valid, error: {}".format(ret_valid),
                 'score'     : 2 * score_validity,
                 'max_score' : 2,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
             {
                 'name'      : '{0}: not too many states explored for \'{1}\' maze'.format(name, case),
-                'output'    : 'You explored {} states, you should explore fewer than 1.2 * {}'.format(maze.states_explored, states_explored),
+                'output'    : 'You explored {} states, you should explore fewer than 1.2 * {}'.format(outcome['states_explored'], states_explored),
                 'score'     : 4 * score_explored,
                 'max_score' : 4,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
             {
                 'name'      : '{0}: correct path length for \'{1}\' maze'.format(name, case),
-                'output'    : 'Your path length is {}, it should be less than 1.2 * {}'.format(len(z), sol_len),
+                'output'    : 'Your path length is {}, it should be less than 1.2 * {}'.format(outcome['length'], sol_len),
                 'score'     : 4 * score_length,
                 'max_score' : 4,
-                'visibility': 'visible'
+                'visibility': 'visible',
+                'extra_data': outcome['timing']
             },
         )
             
-    return tuple(item for case, maze in mazes.items() for item in grade(case, maze))
+    return tuple(item for case, outcome in outcomes.items() for item in grade(case, outcome))
 
 def main():    
     solutions = ('bfs', 'astar_single', 'astar_multiple', 'fast')
@@ -157,29 +351,33 @@ def main():
     
     mazes = (
         # part 1 (BFS): 25 points total, 5 points per case
-        {case: maze.Maze('data/part-1/{0}'.format(case))
+        {case: 'data/part-1/{0}'.format(case)
             for case in ('tiny', 'small', 'open', 'no_obs')}, # 'medium', 'large',
         # part 2 (astar_single): 25 points total, 5 points per case 
-        {case: maze.Maze('data/part-2/{0}'.format(case))
+        {case: 'data/part-2/{0}'.format(case)
             for case in ('tiny', 'small', 'open')}, # 'medium', 'large',
         # part 3 (astar_multi): 40 points total, 10 points per case 
-        {case: maze.Maze('data/part-3/{0}'.format(case))
+        {case: 'data/part-3/{0}'.format(case)
             for case in ('tiny', 'open', 'corner', 'one_d')}, # 'cross', 'small', 'medium',
         # part 4: 10 points total, 10 points per case 
-        #{case: maze.Maze('data/part-4/{0}'.format(case))
+        #{case: 'data/part-4/{0}'.format(case)
         #    for case in ('large',)},
     )
     
-    #generate_answer_key({'instructor': 'key_i', 'student': 'key_s'}, mazes, solutions)
+    if arguments.generate:
+        generate_answer_key({'instructor': 'key_i', 'student': 'key_s'}, mazes, solutions, arguments.workers)
     key             = load_answer_key({'instructor': 'key_i', 'student': 'key_s'})
+    time_start      = time.perf_counter()
+    outcomes        = run_cases(mazes, solutions, arguments.workers, arguments.timeout)
     first_parts    = tuple(item for i, points in zip(range(0, 3), (1, 1, 1))
-        for item in grade_optimal('part-{0}'.format(i + 1), key[i], mazes[i], solutions[i], 
+        for item in grade_optimal('part-{0}'.format(i + 1), key[i], outcomes[i], 
             weight = points))
-    #last_part      = tuple(item for i in range(3, 4) for item in grade_suboptimal('part-{0}'.format(i + 1), key[i], mazes[i], solutions[i]))
+    #last_part      = tuple(item for i in range(3, 4) for item in grade_suboptimal('part-{0}'.format(i + 1), key[i], outcomes[i]))
     
     # construct grade dictionary for gradescope 
     return {
         'visibility': 'visible', 
+        'execution_time': time.perf_counter() - time_start,
         'tests': first_parts
         #'tests': first_parts + last_part
     } 
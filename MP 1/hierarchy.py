@@ -0,0 +1,341 @@
+# hierarchy.py
+# ---------------
+# Hierarchical path-finding (HPA*, Botea, Mueller and Schaeffer, 2004) for very large
+# mazes. The maze is cut into square clusters; every maximal run of open cell pairs
+# across a cluster border is an entrance, represented by one or two transitions (pairs
+# of facing cells). The transition cells are the nodes of an abstract graph, joined by
+# the single move across each transition and by the shortest path between every two
+# nodes of the same cluster that stays inside the cluster.
+#
+# Queries connect the start and goal to the nodes of their clusters, search the much
+# smaller abstract graph, then refine each abstract edge with a search confined to one
+# cluster. Paths are close to, but not always exactly, the shortest. The abstract graph
+# can be saved next to the maze file so repeat runs skip the preprocessing.
+
+import heapq, os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from distances import maze_hash, pool_workers, wavefront
+
+CLUSTER_SIZE    = 32
+# the per-slot distance fields are computed over a process pool from this many cells up
+PARALLEL_CELLS  = 1 << 22
+# entrances at most this wide get one transition in their middle, wider ones get one
+# at each end
+ENTRANCE_WIDTH  = 6
+# bump whenever the saved layout changes so stale files are rebuilt
+FORMAT_VERSION  = 1
+
+def cache_path(filepath):
+    """Returns the file the abstract graph of the maze at `filepath` is saved to"""
+    return filepath + '.hpa.npz'
+
+def cluster_adjacency(maze, size):
+    """Returns a copy of `maze.adjacency` with every move across a cluster border removed"""
+    n, m    = maze.size.y, maze.size.x
+    masks   = np.frombuffer(maze.adjacency, dtype = np.uint8).reshape(n, m).copy()
+    rows, columns = np.arange(n), np.arange(m)
+    # bits are down, up, right, left, as in maze._MOVES
+    masks[(rows + 1) % size == 0, :]    &= np.uint8(~1 & 0xff)
+    masks[rows % size == 0, :]          &= np.uint8(~2 & 0xff)
+    masks[:, (columns + 1) % size == 0] &= np.uint8(~4 & 0xff)
+    masks[:, columns % size == 0]       &= np.uint8(~8 & 0xff)
+    return bytearray(masks.tobytes())
+
+def transitions(free, size):
+    """
+    Finds the transitions across every cluster border of the boolean (rows, columns)
+    grid `free`.
+
+    @return two int64 arrays of flat cell indices, where cells a[k] and b[k] face each
+        other across a cluster border
+    """
+    n, m = free.shape
+    a, b = [], []
+    for transpose in (False, True):
+        grid            = free.T if transpose else free
+        rows, columns   = grid.shape
+        for c in range(size, columns, size):
+            both    = np.zeros(-(-rows // size) * size, dtype = bool)
+            both[:rows] = grid[:, c - 1] & grid[:, c]
+            # split the border into one block per cluster, so runs end at cluster corners
+            blocks  = np.pad(both.reshape(-1, size), ((0, 0), (1, 1))).astype(np.int8)
+            block, first = np.nonzero(np.diff(blocks, axis = 1) == 1)
+            _, last = np.nonzero(np.diff(blocks, axis = 1) == -1)
+            first, last = block * size + first, block * size + last - 1
+
+            wide    = last - first + 1 > ENTRANCE_WIDTH
+            picks   = np.concatenate((np.where(wide, first, (first + last) // 2), last[wide]))
+            if transpose:
+                a.append((c - 1) * m + picks)
+                b.append(c * m + picks)
+            else:
+                a.append(picks * m + c - 1)
+                b.append(picks * m + c)
+    if not a:
+        return np.zeros(0, dtype = np.int64), np.zeros(0, dtype = np.int64)
+    return np.concatenate(a).astype(np.int64), np.concatenate(b).astype(np.int64)
+
+def slot_distances(adjacency, width, nodes, sources):
+    """Returns the distance from the nearest of `sources` to each of `nodes`, or -1 where
+    a node cannot be reached, over the cut adjacency table of a maze"""
+    return wavefront(adjacency, width, sources, shared = True)[0][nodes]
+
+# process pool workers receive the cut adjacency table and the nodes once, through the initializer
+_worker_graph = None
+
+def _initialize_worker(adjacency, width, nodes):
+    global _worker_graph
+    _worker_graph = (adjacency, width, nodes)
+
+def _slot_distances_worker(sources):
+    return slot_distances( * _worker_graph , sources )
+
+class ClusterGraph:
+    """
+    Abstract graph of `maze` over clusters of `size x size` cells.
+
+    `nodes[u]` is the flat cell index of node u; nodes are ordered by cluster. The
+    edges out of node u are `targets[offsets[u]:offsets[u + 1]]`, with lengths in moves
+    in `weights`. If `cache` is a file path (see `cache_path`), the graph is loaded from
+    it when it was built for the same maze and cluster size, and saved to it otherwise.
+    Building reads the maze's adjacency table directly, so it does not count toward
+    `maze.states_explored`.
+    """
+    def __init__(self, maze, size = CLUSTER_SIZE, cache = None, workers = None):
+        self.maze       = maze
+        self.size       = size
+        self.adjacency  = cluster_adjacency(maze, size)
+        self._lists     = None
+
+        digest = maze_hash(maze)
+        if cache is None or not self._load(cache, digest):
+            self._build(workers)
+            if cache is not None:
+                self._save(cache, digest)
+
+        i, j = np.divmod(self.nodes, maze.size.x)
+        self._clusters  = (i // size) * -(-maze.size.x // size) + j // size
+
+    def cluster(self, x):
+        """Returns the cluster containing flat cell index `x`"""
+        i, j = divmod(x, self.maze.size.x)
+        return (i // self.size) * -(-self.maze.size.x // self.size) + j // self.size
+
+    def members(self, x):
+        """Returns the range of nodes in the cluster containing flat cell index `x`"""
+        cluster = self.cluster(x)
+        return range(int(np.searchsorted(self._clusters, cluster, side = 'left')),
+            int(np.searchsorted(self._clusters, cluster, side = 'right')))
+
+    def _build(self, workers):
+        maze    = self.maze
+        m       = maze.size.x
+        free    = maze.grid != ord(maze.legend.wall)
+        a, b    = transitions(free, self.size)
+
+        cells   = np.unique(np.concatenate((a, b)))
+        i, j    = np.divmod(cells, m)
+        clusters = (i // self.size) * -(-m // self.size) + j // self.size
+        order   = np.lexsort((cells, clusters))
+        self.nodes  = cells[order]
+        clusters    = clusters[order]
+        # node of each entry of the (sorted) `cells`
+        node_of     = np.empty(len(cells), dtype = np.int64)
+        node_of[order] = np.arange(len(cells))
+
+        # slot s of a cluster is its s-th node; one shared wavefront per slot computes
+        # the distances from that node of every cluster at once, since the cut
+        # adjacency keeps each wave inside its own cluster
+        first   = np.searchsorted(clusters, clusters, side = 'left')
+        last    = np.searchsorted(clusters, clusters, side = 'right')
+        slot    = np.arange(len(self.nodes)) - first
+        slots   = tuple(self.nodes[slot == s] for s in range(int(slot.max()) + 1 if len(slot) else 0))
+        workers = pool_workers(workers)
+        if len(maze.adjacency) >= PARALLEL_CELLS and workers != 1:
+            with ProcessPoolExecutor(max_workers = workers, initializer = _initialize_worker,
+                    initargs = (self.adjacency, m, self.nodes)) as pool:
+                fields = tuple(pool.map(_slot_distances_worker, slots))
+        else:
+            fields = tuple(slot_distances(self.adjacency, m, self.nodes, sources) for sources in slots)
+
+        sources, targets, weights = [], [], []
+        for s, field in enumerate(fields):
+            # every node whose cluster has a node in slot s
+            t   = np.flatnonzero(last - first > s)
+            d   = field[t]
+            t, d = t[d > 0], d[d > 0]
+            sources.append(first[t] + s)
+            targets.append(t)
+            weights.append(d)
+
+        u, v    = node_of[np.searchsorted(cells, a)], node_of[np.searchsorted(cells, b)]
+        sources.extend((u, v))
+        targets.extend((v, u))
+        weights.extend((np.ones(len(u), dtype = np.int32),) * 2)
+
+        sources = np.concatenate(sources).astype(np.int64)
+        order   = np.argsort(sources, kind = 'stable')
+        self.targets    = np.concatenate(targets).astype(np.int32)[order]
+        self.weights    = np.concatenate(weights).astype(np.int32)[order]
+        self.offsets    = np.concatenate(([0], np.cumsum(np.bincount(sources, minlength = len(self.nodes)))))
+
+    def _load(self, path, digest):
+        try:
+            with np.load(path) as data:
+                if (int(data['version']) != FORMAT_VERSION or int(data['size']) != self.size
+                        or str(data['digest']) != digest):
+                    return False
+                self.nodes, self.offsets = data['nodes'], data['offsets']
+                self.targets, self.weights = data['targets'], data['weights']
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def _save(self, path, digest):
+        try:
+            # write to a temporary file first so concurrent runs never read a partial graph
+            with open(path + '.{0}.tmp'.format(os.getpid()), 'wb') as file:
+                np.savez(file, version = FORMAT_VERSION, size = self.size, digest = digest,
+                    nodes = self.nodes, offsets = self.offsets, targets = self.targets,
+                    weights = self.weights)
+            os.replace(path + '.{0}.tmp'.format(os.getpid()), path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _local(self, source, targets):
+        """
+        Runs BFS from flat cell `source` without leaving its cluster.
+
+        @return distances: a dictionary mapping each reachable cell of `targets` to its
+            distance from source
+        """
+        adjacency, width = self.adjacency, self.maze.size.x
+        offsets = (width, -width, 1, -1)
+        targets = set(targets)
+        found   = {}
+        depth   = {source: 0}
+        frontier = [source]
+        while frontier and len(found) < len(targets):
+            self.maze.states_explored += len(frontier)
+            for x in frontier:
+                if x in targets:
+                    found[x] = depth[x]
+            following = []
+            for x in frontier:
+                mask = adjacency[x]
+                for bit, offset in enumerate(offsets):
+                    if mask >> bit & 1 and x + offset not in depth:
+                        depth[x + offset] = depth[x] + 1
+                        following.append(x + offset)
+            frontier = following
+        return found
+
+    def _refine(self, source, target):
+        """Returns the flat cells of a shortest path from `source` to `target` (excluding
+        source) that stays inside their shared cluster"""
+        adjacency, width = self.adjacency, self.maze.size.x
+        offsets = (width, -width, 1, -1)
+        ti, tj  = divmod(target, width)
+
+        prev    = {source: None}
+        queue   = [(0, 0, source)]
+        while queue:
+            _, g, x = heapq.heappop(queue)
+            g = -g
+            if x == target:
+                break
+            self.maze.states_explored += 1
+            mask = adjacency[x]
+            for bit, offset in enumerate(offsets):
+                y = x + offset
+                if mask >> bit & 1 and y not in prev:
+                    prev[y] = x
+                    i, j = divmod(y, width)
+                    heapq.heappush(queue, (g + 1 + abs(i - ti) + abs(j - tj), -g - 1, y))
+        path = []
+        while x != source:
+            path.append(x)
+            x = prev[x]
+        return path[::-1]
+
+    def astar(self, source, target):
+        """
+        Finds a path from cell `source` to cell `target` through the abstract graph.
+        Expanding an abstract node, or a cell while connecting to or refining within a
+        cluster, counts as one explored state in the maze.
+
+        @return path: a list of (row, col) tuples from source to target, or [] if
+            target cannot be reached
+        """
+        maze    = self.maze
+        source, target = maze.index( * source ), maze.index( * target )
+        if self._lists is None:
+            # plain lists index much faster than numpy arrays, one element at a time; the
+            # edges are sliced out per expansion instead, since there are many more of them
+            self._lists = (self.nodes.tolist(), self.offsets.tolist())
+        nodes, offsets = self._lists
+
+        # connect the source and target to the nodes of their clusters; the source is
+        # abstract node -1 and the target abstract node -2
+        members = self.members(source)
+        found   = self._local(source, [nodes[u] for u in members] + [target])
+        exits   = [(u, found[nodes[u]]) for u in members if nodes[u] in found]
+        if target in found:
+            exits.append((-2, found[target]))
+        members = self.members(target)
+        found   = self._local(target, [nodes[u] for u in members])
+        entries = {u: found[nodes[u]] for u in members if nodes[u] in found}
+
+        ti, tj  = divmod(target, maze.size.x)
+        def heuristic(u):
+            if u == -2:
+                return 0
+            i, j = divmod(nodes[u], maze.size.x)
+            return abs(i - ti) + abs(j - tj)
+
+        best    = {}
+        prev    = {}
+        # ties on f are broken towards the deeper node (the second key is -g), otherwise
+        # A* expands every node in the box between source and target on open maps
+        queue   = [(d + heuristic(u), -d, u, -1) for u, d in exits]
+        heapq.heapify(queue)
+        prev[-1] = None
+        while queue:
+            _, curr_g, curr, parent = heapq.heappop(queue)
+            curr_g = -curr_g
+            if curr in prev:
+                continue
+            prev[curr] = parent
+            if curr == -2:
+                break
+            maze.states_explored += 1
+            lo, hi = offsets[curr], offsets[curr + 1]
+            edges = list(zip(self.targets[lo:hi].tolist(), self.weights[lo:hi].tolist()))
+            if curr in entries:
+                edges.append((-2, entries[curr]))
+            for v, w in edges:
+                if v not in prev and curr_g + w < best.get(v, curr_g + w + 1):
+                    best[v] = curr_g + w
+                    heapq.heappush(queue, (curr_g + w + heuristic(v), -curr_g - w, v, curr))
+        else:
+            return []
+
+        # expand the abstract path back into cells, one cluster at a time
+        cells = []
+        while curr is not None:
+            cells.append(source if curr == -1 else target if curr == -2 else nodes[curr])
+            curr = prev[curr]
+        cells.reverse()
+        path = [source]
+        for a, b in zip(cells, cells[1:]):
+            if self.cluster(a) != self.cluster(b):
+                path.append(b)
+            elif a != b:
+                path.extend(self._refine(a, b))
+        return [maze.cell(x) for x in path]
@@ -14,11 +14,15 @@ initializes the pygame context, and handles the interface between the
 game and the search algorithm.
 """
 
-import sys, argparse, time
+import sys, argparse, contextlib, time
 
 import pygame
 
-from maze import Maze
+from hierarchy import ClusterGraph, cache_path
+from maze import Maze, MazeError
+import render
+from replan import DStarLite
+import tracing
 import search
 
 class gradient:
@@ -53,19 +57,28 @@ class Application:
         self.fps        = fps
         
         self.human      = human 
+        self.alt_color  = alt_color
         # accessibility for colorblind students 
         if alt_color:
             self.gradient = gradient((64, 224, 208), (139, 0, 139))
         else:
             self.gradient = gradient((255, 0, 0), (0, 255, 0))
+        # replayed traces color cells by how often they were expanded
+        self.heat = gradient((255, 255, 191), (189, 0, 38))
 
-    def run(self, filepath, mode, save):
+    def run(self, filepath, mode, save, trace = None, replay = None):
         self.maze   = Maze(filepath)
         
         self.window = tuple(x * self.scale for x in self.maze.size)
 
+        if replay is not None:
+            return self.replay(filepath, tracing.Trace.load(replay))
+
         if self.human:
             self.agent = agent(self.maze.start, self.maze)
+            # suggested route to the first waypoint, kept up to date incrementally
+            self.planner    = DStarLite(self.maze) if self.maze.waypoints else None
+            self.hint       = []
             
             path            = []
             states_explored = 0
@@ -73,11 +86,27 @@ class Application:
             #time in seconds
             time_start      = time.time()
             
-            path            = getattr(search, mode)(self.maze)
+            tracer          = tracing.Tracer(self.maze) if trace is not None else contextlib.nullcontext()
+            with tracer:
+                if mode == 'hpa':
+                    # the abstract graph is saved next to the maze file, so later runs load it
+                    path    = search.hpa(self.maze, ClusterGraph(self.maze, cache = cache_path(filepath)))
+                else:
+                    path    = getattr(search, mode)(self.maze)
             states_explored = self.maze.states_explored
             
             time_total      = time.time() - time_start   
 
+            if trace is not None:
+                self.print_trace(tracer.trace)
+                tracer.trace.save(trace)
+
+        # solutions saved to file are rasterized directly, without opening a display
+        if not self.human and type(save) is str:
+            self.print_results(path, states_explored, time_total)
+            render.save(save, render.render(self.maze, path, self.scale, self.alt_color))
+            return
+
         pygame.init()
         
         self.surface = pygame.display.set_mode(self.window, pygame.HWSURFACE)
@@ -86,17 +115,10 @@ class Application:
         pygame.display.set_caption('MP1 ({0})'.format(filepath))
 
         if self.human:
+            self.draw_hint()
             self.draw_player()
         else:
-            print("""
-Results 
-{{
-    path length         : {0}
-    states explored     : {1}
-    total execution time: {2:.2f} seconds
-}}
-            """.format(len(path), states_explored, time_total))
-            
+            self.print_results(path, states_explored, time_total)
             self.draw_path(path)
 
         self.draw_maze()
@@ -128,14 +150,99 @@ Results
                             pygame.K_UP     : (-1,  0),
                             pygame.K_DOWN   : ( 1,  0),
                         }[event.key] 
-                        path.extend(self.agent.move(move))
+                        moved = self.agent.move(move)
+                        path.extend(moved)
+                        if moved and self.planner is not None:
+                            self.planner.move(self.agent.position)
                     except KeyError: 
                         pass
                 
                     self.loop(path + [self.agent.position])
+                elif    event.type == pygame.MOUSEBUTTONDOWN and self.human:
+                    # clicking a cell toggles it between wall and open
+                    x, y = event.pos
+                    cell = (y // self.scale, x // self.scale)
+                    if cell == self.agent.position:
+                        continue
+                    try:
+                        if self.planner is not None:
+                            self.planner.toggle(cell)
+                        else:
+                            self.maze.toggle( * cell )
+                    except MazeError:
+                        continue
+                    self.draw_square( * cell , (255, 255, 255) if self.maze.navigable( * cell ) else (0, 0, 0))
+                    self.loop(path + [self.agent.position])
+
+    def print_results(self, path, states_explored, time_total):
+        print("""
+Results 
+{{
+    path length         : {0}
+    states explored     : {1}
+    total execution time: {2:.2f} seconds
+}}
+            """.format(len(path), states_explored, time_total))
+
+    def print_trace(self, trace):
+        print("""
+Trace 
+{{
+    expansions          : {0}
+    heap pushes         : {1}
+    heap pops           : {2}
+    duplicate pushes    : {3} ({4:.1%})
+    peak frontier       : {5}
+    phases              : {6}
+}}
+            """.format(len(trace.expansions), trace.pushes, trace.pops, trace.duplicates, trace.duplicate_ratio,
+                max(trace.frontier, default = 0), 
+                ', '.join('{0} {1:.3f}s'.format(name, seconds) for name, seconds in trace.phases.items())))
+
+    # Animates a recorded trace as a heat map of how often each cell was expanded
+    def replay(self, filepath, trace, seconds = 10):
+        if (trace.rows, trace.columns) != (self.maze.size.y, self.maze.size.x):
+            raise SystemExit('trace of a {0}x{1} maze does not match maze \'{2}\''.format(trace.rows, trace.columns, filepath))
+        self.print_trace(trace)
+
+        pygame.init()
+        self.surface = pygame.display.set_mode(self.window, pygame.HWSURFACE)
+        self.surface.fill((255, 255, 255))
+        self.draw_maze()
+        self.draw_start()
+        self.draw_waypoints()
+        pygame.display.flip()
+
+        counts  = {}
+        for x in trace.expansions:
+            counts[x] = counts.get(x, 0) + 1
+        top     = max(counts.values(), default = 1)
+        counts  = {}
+        # play the whole trace back in about `seconds` seconds
+        step    = max(1, -(-len(trace.expansions) // (self.fps * seconds)))
+        shown   = 0
+        clock   = pygame.time.Clock()
+        while self.running:
+            pygame.event.pump()
+            clock.tick(self.fps)
+            
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    raise SystemExit
+
+            if shown < len(trace.expansions):
+                for x in trace.expansions[shown:shown + step]:
+                    counts[x] = counts.get(x, 0) + 1
+                    self.draw_square( * self.maze.cell(x) , self.heat[counts[x] - 1, top])
+                shown = min(len(trace.expansions), shown + step)
+                self.draw_waypoints()
+                pygame.display.set_caption('MP1 replay ({0}): {1}/{2} expanded, frontier {3}'.format(
+                    filepath, shown, len(trace.expansions), trace.frontier[shown - 1]))
+                pygame.display.flip()
 
     # The game loop is where everything is drawn to the context. Only called when a human is playing
     def loop(self, path):
+        self.draw_hint()
         self.draw_path(path)
         self.draw_waypoints()
         self.draw_player()
@@ -146,6 +253,18 @@ Results
         for i, x in enumerate(path):
             self.draw_square( * x , self.gradient[i, len(path)])
     
+    # Erases the previous suggested route and draws the replanned one (only called if there is a human player)
+    def draw_hint(self):
+        if self.planner is None:
+            return
+        for x in self.hint:
+            if self.maze.navigable( * x ):
+                self.draw_square( * x , (255, 255, 255))
+        self.hint = self.planner.path()
+        for x in self.hint:
+            self.draw_square( * x , (208, 208, 208))
+        self.draw_start()
+
     # Draws the full maze to the display context
     def draw_maze(self):
         for x in self.maze.indices():
@@ -182,7 +301,7 @@ if __name__ == "__main__":
     parser.add_argument('path',
                         help = 'path to maze file')
     parser.add_argument('--search', dest = 'search', type = str, default = 'bfs',
-                        choices = ('bfs', 'astar_corner', 'astar_single', 'fast', 'astar_multiple'), 
+                        choices = ('bfs', 'astar_corner', 'astar_single', 'astar_corridor', 'jps', 'hpa', 'fast', 'astar_multiple', 'tour'), 
                         help = 'search method')
     parser.add_argument('--scale',  dest = 'scale', type = int, default = 20,
                         help = 'display scale')
@@ -194,10 +313,16 @@ if __name__ == "__main__":
                         help = 'save output to image file')
     parser.add_argument('--altcolor', dest = 'altcolor', default = False, action = 'store_true',
                         help = 'view in an alternate color scheme')
+    parser.add_argument('--trace', dest = 'trace', type = str, default = None,
+                        help = 'record the search to this trace file')
+    parser.add_argument('--replay', dest = 'replay', type = str, default = None,
+                        help = 'animate a recorded trace file as a heat map instead of searching')
 
     arguments   = parser.parse_args()
     application = Application(arguments.human, arguments.scale, arguments.fps, arguments.altcolor)
     application.run(
         filepath    = arguments.path, 
         mode        = arguments.search, 
-        save        = arguments.save)
+        save        = arguments.save,
+        trace       = arguments.trace,
+        replay      = arguments.replay)
@@ -9,7 +9,16 @@
 # Inspired by previous work by Michael Abir (abir2@illinois.edu) and Rahul Kunji (rahulsk2@illinois.edu)
 
 from collections import namedtuple
-from itertools import chain 
+
+import numpy as np
+
+# moves in the order `neighbors` reports them (down, up, right, left); bit k of a 
+# cell's adjacency mask is set if moving by _MOVES[k] from that cell is navigable
+_MOVES  = ((1, 0), (-1, 0), (0, 1), (0, -1))
+_STEPS  = tuple(tuple(move for bit, move in enumerate(_MOVES) if mask >> bit & 1) 
+    for mask in range(1 << len(_MOVES)))
+# ASCII bytes that `str.strip` would remove from the ends of a row
+_WHITESPACE = np.frombuffer(b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f', dtype = np.uint8)
 
 class MazeError(Exception):
     pass
@@ -31,60 +40,112 @@ class Maze:
             legend['start'], 
             legend['waypoint'])
         
-        with open(path) as file:
-            lines = tuple(line.strip() for line in file.readlines() if line)
-        
-        # Stores copy of ASCII maze in self._storage as well as dimensions in self.size.x/y
-        n = len(lines)
-        m = min(map(len, lines))
-        
-        if any(len(line) != m for line in lines):
-            raise MazeError('(maze \'{0}\'): all maze rows must be the same length (shortest row has length {1})'.format(path, m))
-        
-        self._storage   = lines 
+        # Stores the maze as a (rows, columns) byte grid in self.grid as well as dimensions in self.size.x/y
+        self.grid       = self._load(path)
+        n, m            = self.grid.shape
         self.size       = namedtuple('size', ('x', 'y'))(m, n)
         
-        if any(self[x] != self.legend.wall for x in chain(
-            ((    0, j) for j in range(m)), 
-            ((n - 1, j) for j in range(m)), 
-            ((i,     0) for i in range(n)), 
-            ((i, m - 1) for i in range(n)))):
+        wall            = ord(self.legend.wall)
+        if not ((self.grid[[0, -1], :] == wall).all() and (self.grid[:, [0, -1]] == wall).all()):
             raise MazeError('(maze \'{0}\'): maze borders must only contain `wall` cells (\'{1}\')'.format(path, self.legend.wall))
         if n < 3 or m < 3:
             raise MazeError('(maze \'{0}\'): maze dimensions ({1}, {2}) must be at least (3, 3)'.format(path, n, m))
         
+        # Stores, for every flat cell index i * size.x + j, a bitmask of its navigable neighbors in self.adjacency 
+        self._build_adjacency()
+        
         # Checks if only 1 start, if so, stores index in self.start
-        self.start  = None 
-        for x in ((i, j) 
-            for i in range(self.size.y) 
-            for j in range(self.size.x) if self[i, j] == self.legend.start):
-            if self.start is None:
-                self.start = x
-            elif type(self.start) is int:
-                self.start += 1 
-            else: 
-                self.start  = 2
-        if type(self.start) is int or self.start is None:
+        starts      = np.flatnonzero(self.grid == ord(self.legend.start))
+        if len(starts) != 1:
             raise MazeError('(maze \'{0}\'): maze must contain exactly one `start` cell (\'{1}\') (found {2})'.format(
-                path, self.legend.start, 0 if self.start is None else self.start))
+                path, self.legend.start, len(starts)))
+        self.start  = divmod(int(starts[0]), m)
         
         # Stores waypoint indices in self.waypoints
-        self.waypoints = tuple((i, j) 
-            for i in range(self.size.y) 
-            for j in range(self.size.x) if self[i, j] == self.legend.waypoint)
+        rows, columns  = np.divmod(np.flatnonzero(self.grid == ord(self.legend.waypoint)), m)
+        self.waypoints = tuple(zip(rows.tolist(), columns.tolist()))
         
         # there is no point in making this private since anyone trying to cheat 
         # could simply overwrite the underscored variable
         self.states_explored    = 0
     
     def __getitem__(self, index):
-        """Access data at index via self[index] instead of using self._storage"""
+        """Access data at index via self[index] instead of using self.grid"""
         i, j = index
         if 0 <= i < self.size.y and 0 <= j < self.size.x:
-            return self._storage[i][j]
+            return chr(self.grid[i, j])
         else:
             raise IndexError('cell index ({0}, {1}) out of range'.format(i, j))
     
+    def _load(self, path):
+        """Reads the maze file at `path` in bulk into a (rows, columns) byte grid"""
+        data = np.fromfile(path, dtype = np.uint8)
+        if (data == ord('\r')).any():
+            data = data[data != ord('\r')]
+        if len(data) and data[-1] != ord('\n'):
+            data = np.append(data, np.uint8(ord('\n')))
+        
+        # fast path: equal-length ASCII rows with no whitespace to strip are a plain reshape
+        ends = np.flatnonzero(data == ord('\n'))
+        if len(ends) and ends[0] > 0 and data.max() < 0x80:
+            n, m = len(ends), int(ends[0])
+            if len(data) == n * (m + 1) and (data[m::m + 1] == ord('\n')).all():
+                grid = data.reshape(n, m + 1)[:, :m]
+                if not np.isin(grid[:, [0, -1]], _WHITESPACE).any():
+                    return np.ascontiguousarray(grid)
+        
+        # otherwise strip each line as text
+        with open(path) as file:
+            lines = tuple(line.strip() for line in file.readlines() if line)
+        
+        n = len(lines)
+        m = min(map(len, lines))
+        
+        if any(len(line) != m for line in lines):
+            raise MazeError('(maze \'{0}\'): all maze rows must be the same length (shortest row has length {1})'.format(path, m))
+        
+        return np.frombuffer(''.join(lines).encode('latin-1', 'replace'), dtype = np.uint8).reshape(n, m).copy()
+    
+    def _build_adjacency(self):
+        n, m    = self.size.y, self.size.x
+        free    = (self.grid != ord(self.legend.wall)).view(np.uint8)
+        mask    = np.zeros((n, m), dtype = np.uint8)
+        mask[:-1, :] |= free[1:, :]
+        mask[1:, :]  |= free[:-1, :] << 1
+        mask[:, :-1] |= free[:, 1:] << 2
+        mask[:, 1:]  |= free[:, :-1] << 3
+        
+        self.adjacency = bytearray(mask.tobytes())
+        # flat-index offsets for each adjacency mask, same order as _STEPS
+        self._offsets   = tuple(tuple(i * m + j for i, j in steps) for steps in _STEPS)
+    
+    def toggle(self, i, j):
+        """Turns the wall cell (i, j) into an open cell or the open cell (i, j) into a wall"""
+        if not (0 < i < self.size.y - 1 and 0 < j < self.size.x - 1):
+            raise MazeError('cell index ({0}, {1}) is not inside the maze border'.format(i, j))
+        if self[i, j] in (self.legend.start, self.legend.waypoint):
+            raise MazeError('cell ({0}, {1}) is a `start` or `waypoint` cell and cannot be toggled'.format(i, j))
+        
+        opened = self[i, j] == self.legend.wall
+        self.grid[i, j] = ord(' ') if opened else ord(self.legend.wall)
+        # the neighbors' bits pointing back at this cell are the only ones that change
+        index = i * self.size.x + j
+        for bit, (di, dj) in enumerate(_MOVES):
+            neighbor = index + di * self.size.x + dj
+            if opened:
+                self.adjacency[neighbor] |= 1 << (bit ^ 1)
+            else:
+                self.adjacency[neighbor] &= ~(1 << (bit ^ 1))
+        return opened
+    
+    def index(self, i, j):
+        """Returns the flat index of cell (i, j)"""
+        return i * self.size.x + j
+    
+    def cell(self, index):
+        """Returns the (i, j) cell at a flat index"""
+        return divmod(index, self.size.x)
+    
     def indices(self):
         """Returns generator of all indices in maze"""
         return ((i, j) 
@@ -93,14 +154,13 @@ class Maze:
     
     def navigable(self, i, j):
         """Check if moving to (i,j) is a valid move"""
-        try:
-            return self[i, j] != self.legend.wall 
-        except IndexError:
-            return False 
+        return 0 <= i < self.size.y and 0 <= j < self.size.x and self.grid[i, j] != ord(self.legend.wall)
 
     def neighbors(self, i, j):
         """Returns list of neighboing squares that can be moved to from the given row,col"""
         self.states_explored += 1 
+        if 0 <= i < self.size.y and 0 <= j < self.size.x:
+            return tuple((i + di, j + dj) for di, dj in _STEPS[self.adjacency[i * self.size.x + j]])
         return tuple(x for x in (
             (i + 1, j),
             (i - 1, j),
@@ -108,43 +168,60 @@ class Maze:
             (i, j - 1)) 
             if self.navigable( * x ))
 
+    def flat_neighbors(self, index):
+        """Same as `neighbors`, but takes and returns flat cell indices"""
+        self.states_explored += 1 
+        return tuple(index + offset for offset in self._offsets[self.adjacency[index]])
+
     def validate_path(self, path):
         # validate type and shape 
         if len(path) == 0:
             return 'path must not be empty'
-        if not all(len(vertex) == 2 for vertex in path):
+        try:
+            # normalize path in case student used an element type that is not `tuple` 
+            vertices = np.asarray(path, dtype = np.int64)
+        except (TypeError, ValueError):
+            vertices = None
+        if vertices is None or vertices.ndim != 2 or vertices.shape[1] != 2:
             return 'each path element must be a two-element sequence'
-        
-        # normalize path in case student used an element type that is not `tuple` 
-        path = tuple(map(tuple, path))
+        rows, columns = vertices[:, 0], vertices[:, 1]
 
         # check if path is contiguous
-        for i, (a, b) in enumerate(zip(path, path[1:])):
-            if sum(abs(b - a) for a, b in zip(a, b)) != 1:
-                return 'path vertex {1} ({4}, {5}) must be exactly one move away from path vertex {0} ({2}, {3})'.format(
-                    i, i + 1, * a , * b )
+        steps = np.flatnonzero(np.abs(np.diff(vertices, axis = 0)).sum(axis = 1) != 1)
+        if len(steps):
+            i = int(steps[0])
+            return 'path vertex {1} ({4}, {5}) must be exactly one move away from path vertex {0} ({2}, {3})'.format(
+                i, i + 1, * vertices[i].tolist() , * vertices[i + 1].tolist() )
 
         # check if path is navigable 
-        for i, x in enumerate(path):
-            if not self.navigable( * x ):
-                return 'path vertex {0} ({1}, {2}) is not a navigable maze cell'.format(i, * x )
+        inside = (0 <= rows) & (rows < self.size.y) & (0 <= columns) & (columns < self.size.x)
+        cells = np.where(inside, rows * self.size.x + columns, 0)
+        blocked = np.flatnonzero(~inside | (self.grid.ravel()[cells] == ord(self.legend.wall)))
+        if len(blocked):
+            i = int(blocked[0])
+            return 'path vertex {0} ({1}, {2}) is not a navigable maze cell'.format(i, * vertices[i].tolist() )
         
         # check if path ends at a waypoint 
-        for waypoint in self.waypoints:
-            if path[-1] == waypoint:
-                break 
-        else:
-            return 'last path vertex {0} ({1}, {2}) must be a waypoint'.format(len(path) - 1, * path[-1] )
+        waypoint = self.grid.ravel()[cells] == ord(self.legend.waypoint)
+        if not waypoint[-1]:
+            return 'last path vertex {0} ({1}, {2}) must be a waypoint'.format(len(path) - 1, * vertices[-1].tolist() )
 
-        # check for unnecessary path segments
-        indices = {}
-        for i, x in enumerate(path):
-            if x in indices:
-                if all(self[x] != self.legend.waypoint for x in path[indices[x] : i]):
-                    return 'path segment [{0} : {1}] contains no waypoints'.format(indices[x], i)
-            indices[x] = i 
+        # check for unnecessary path segments: a vertex may only repeat if a waypoint 
+        # was reached at or after its previous occurrence
+        order = np.argsort(cells, kind = 'stable')
+        previous = np.full(len(cells), -1, dtype = np.int64)
+        repeats = cells[order[1:]] == cells[order[:-1]]
+        previous[order[1:][repeats]] = order[:-1][repeats]
+        # last_waypoint[i] is the index of the last waypoint strictly before vertex i
+        last_waypoint = np.maximum.accumulate(np.where(waypoint, np.arange(len(cells)), -1))
+        last_waypoint = np.concatenate(((-1,), last_waypoint[:-1]))
+        unnecessary = np.flatnonzero((previous >= 0) & (last_waypoint < previous))
+        if len(unnecessary):
+            i = int(unnecessary[0])
+            return 'path segment [{0} : {1}] contains no waypoints'.format(int(previous[i]), i)
         
         # check if path contains all waypoints 
+        visited = np.isin([self.index( * x ) for x in self.waypoints], cells)
         for i, x in enumerate(self.waypoints):
-            if x not in indices:
+            if not visited[i]:
                 return 'waypoint {0} ({1}, {2}) was never visited'.format(i, * x )
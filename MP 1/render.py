@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# render.py
+# ---------------
+# Headless rendering of MP1 mazes and solutions. Draws the same picture as
+# main.py (path gradient, walls, start and waypoints) straight into a NumPy RGB
+# buffer and writes it as a PNG, so images can be produced on machines without a
+# display. This module does not import pygame.
+
+import argparse, os, struct, zlib
+from multiprocessing import Pool
+
+import numpy as np
+
+from maze import Maze
+import search
+
+WHITE           = (255, 255, 255)
+BLACK           = (0, 0, 0)
+BLUE            = (0, 0, 255)
+# path gradients, the same as main.Application's
+GRADIENT        = ((255, 0, 0), (0, 255, 0))
+ALT_GRADIENT    = ((64, 224, 208), (139, 0, 139))
+
+def gradient(n, start, end):
+    """Returns an (n, 3) array with the color of each of n path cells"""
+    t = np.arange(n) / max(1, n - 1)
+    colors = np.outer(1 - t, start) + np.outer(t, end)
+    return np.clip(colors, 0, 255).astype(np.uint8)
+
+def render(maze, path = (), scale = 20, alt_color = False):
+    """
+    Rasterizes `maze` and `path` into a (rows * scale, columns * scale, 3) uint8 array.
+    """
+    cells = np.empty((maze.size.y, maze.size.x, 3), dtype = np.uint8)
+    cells[:] = WHITE
+    if len(path):
+        rows, columns = np.asarray(path, dtype = np.int64).T
+        cells[rows, columns] = gradient(len(path), * (ALT_GRADIENT if alt_color else GRADIENT) )
+    cells[maze.grid == ord(maze.legend.wall)] = BLACK
+    image = np.repeat(np.repeat(cells, scale, axis = 0), scale, axis = 1)
+
+    # start is a blue square covering the middle half of its cell
+    i, j = maze.start
+    x, y, w, h = (int(k * scale) for k in (j + 0.25, i + 0.25, 0.5, 0.5))
+    image[y:y + h, x:x + w] = BLUE
+
+    # waypoints are black discs of radius scale / 4
+    if maze.waypoints:
+        radius = int(scale / 4)
+        dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        disc = dy * dy + dx * dx <= radius * radius
+        dy, dx = dy[disc], dx[disc]
+        centers = (np.asarray(maze.waypoints, dtype = np.int64) + 0.5) * scale
+        ys = (centers[:, 0].astype(np.int64)[:, None] + dy).ravel()
+        xs = (centers[:, 1].astype(np.int64)[:, None] + dx).ravel()
+        inside = (0 <= ys) & (ys < image.shape[0]) & (0 <= xs) & (xs < image.shape[1])
+        image[ys[inside], xs[inside]] = BLACK
+    return image
+
+def save(path, image):
+    """Writes an (height, width, 3) uint8 array to `path` as an 8-bit RGB PNG"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    height, width, _ = image.shape
+    # every scanline is prefixed with filter type 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype = np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+    with open(path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+        file.write(chunk(b'IEND', b''))
+
+def render_file(task):
+    """Solves the maze at `filepath` with `mode` (if any) and saves its image to `output`"""
+    filepath, output, mode, scale, alt_color = task
+    maze = Maze(filepath)
+    path = getattr(search, mode)(maze) if mode is not None else ()
+    save(output, render(maze, path, scale, alt_color))
+    return output
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description     = 'CS440 MP1 headless renderer',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('paths', nargs = '+',
+                        help = 'paths to maze files or directories of maze files')
+    parser.add_argument('--output', dest = 'output', type = str, default = '.',
+                        help = 'directory to write images to')
+    parser.add_argument('--search', dest = 'search', type = str, default = None,
+                        choices = ('bfs', 'astar_single', 'astar_corridor', 'jps', 'hpa', 'fast', 'astar_multiple', 'tour'),
+                        help = 'search method to draw the solution of (none if omitted)')
+    parser.add_argument('--scale',  dest = 'scale', type = int, default = 20,
+                        help = 'display scale')
+    parser.add_argument('--altcolor', dest = 'altcolor', default = False, action = 'store_true',
+                        help = 'view in an alternate color scheme')
+    parser.add_argument('--workers', dest = 'workers', type = int, default = None,
+                        help = 'number of worker processes (defaults to the number of cpus)')
+
+    arguments   = parser.parse_args()
+    filepaths   = []
+    for path in arguments.paths:
+        if os.path.isdir(path):
+            filepaths.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                if os.path.isfile(os.path.join(path, name)))
+        else:
+            filepaths.append(path)
+
+    os.makedirs(arguments.output, exist_ok = True)
+    # name images after the whole maze path, since e.g. every part has an `open` maze
+    tasks = tuple((filepath, os.path.join(arguments.output, '{0}.png'.format(
+            os.path.normpath(filepath).strip(os.sep).replace(os.sep, '_'))),
+        arguments.search, arguments.scale, arguments.altcolor) for filepath in filepaths)
+    with Pool(arguments.workers) as pool:
+        for output in pool.imap_unordered(render_file, tasks):
+            print(output)
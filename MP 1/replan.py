@@ -0,0 +1,117 @@
+# replan.py
+# ---------------
+# Incremental replanning with D* Lite (Koenig and Likhachev, 2002). The planner
+# searches backwards from the objective and keeps its g/rhs values between queries,
+# so after the agent moves or a cell is toggled between wall and open, only the
+# cells whose distances actually changed are expanded again.
+
+import heapq
+
+class DStarLite:
+    """
+    Plans shortest paths from a moving start to a fixed objective on `maze`, which
+    may be edited with `toggle` between queries. Expanding a cell counts as one
+    explored state in the maze.
+    """
+    def __init__(self, maze, start = None, goal = None):
+        self.maze   = maze
+        self.start  = maze.index( * (maze.start if start is None else start) )
+        self.goal   = maze.index( * (maze.waypoints[0] if goal is None else goal) )
+        self.km     = 0
+        self.g      = {}
+        self.rhs    = {self.goal: 0}
+        # queued cells map to their current key; heap entries with another key are stale
+        self._keys  = {}
+        self._queue = []
+        self._offsets = (maze.size.x, -maze.size.x, 1, -1)
+        self._insert(self.goal)
+
+    def _heuristic(self, a, b):
+        (ai, aj), (bi, bj) = self.maze.cell(a), self.maze.cell(b)
+        return abs(ai - bi) + abs(aj - bj)
+
+    def _key(self, x):
+        best = min(self.g.get(x, float('inf')), self.rhs.get(x, float('inf')))
+        return (best + self._heuristic(self.start, x) + self.km, best)
+
+    def _insert(self, x):
+        key = self._key(x)
+        self._keys[x] = key
+        heapq.heappush(self._queue, (key, x))
+
+    def _successors(self, x):
+        # moves are symmetric, so these are also the predecessors of x
+        mask = self.maze.adjacency[x]
+        return tuple(x + offset for bit, offset in enumerate(self._offsets) if mask >> bit & 1)
+
+    def _navigable(self, x):
+        return self.maze.grid.flat[x] != ord(self.maze.legend.wall)
+
+    def _update(self, x):
+        if x != self.goal:
+            if self._navigable(x):
+                self.rhs[x] = min((1 + self.g.get(y, float('inf')) for y in self._successors(x)),
+                    default = float('inf'))
+            else:
+                self.rhs[x] = float('inf')
+        self._keys.pop(x, None)
+        if self.g.get(x, float('inf')) != self.rhs.get(x, float('inf')):
+            self._insert(x)
+
+    def _top(self):
+        while self._queue and self._keys.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+        return self._queue[0] if self._queue else ((float('inf'), float('inf')), None)
+
+    def compute(self):
+        """Expands cells until the distance from the start is settled"""
+        inf = float('inf')
+        while True:
+            key, x = self._top()
+            if x is None or (key >= self._key(self.start)
+                    and self.rhs.get(self.start, inf) == self.g.get(self.start, inf)):
+                return
+            self.maze.states_explored += 1
+            new_key = self._key(x)
+            if key < new_key:
+                self._insert(x)
+            elif self.g.get(x, inf) > self.rhs.get(x, inf):
+                self.g[x] = self.rhs[x]
+                del self._keys[x]
+                for y in self._successors(x):
+                    self._update(y)
+            else:
+                self.g[x] = inf
+                for y in self._successors(x) + (x,):
+                    self._update(y)
+
+    def move(self, cell):
+        """Moves the start to `cell`, e.g. after the agent has taken a step"""
+        start = self.maze.index( * cell )
+        self.km += self._heuristic(self.start, start)
+        self.start = start
+
+    def toggle(self, cell):
+        """Toggles `cell` between wall and open in the maze and repairs the affected distances"""
+        opened = self.maze.toggle( * cell )
+        x = self.maze.index( * cell )
+        if not opened:
+            self.g.pop(x, None)
+        for y in (x,) + tuple(x + offset for offset in self._offsets):
+            self._update(y)
+        return opened
+
+    def path(self):
+        """
+        Replans and returns the shortest path from the start to the objective.
+
+        @return path: a list of (row, col) tuples, or [] if the objective cannot be reached
+        """
+        self.compute()
+        inf = float('inf')
+        if self.g.get(self.start, inf) == inf:
+            return []
+        path = [self.start]
+        while path[-1] != self.goal:
+            path.append(min(self._successors(path[-1]), key = lambda y: self.g.get(y, inf)))
+        return [self.maze.cell(x) for x in path]
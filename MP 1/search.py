@@ -20,19 +20,29 @@ files and classes when code is run, so be careful to not modify anything else.
 
 import queue as queue
 import heapq as heapq
+import time
+from array import array
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+
+from contraction import CorridorGraph, corridor_ratio
+from distances import WaypointDistances
+from hierarchy import ClusterGraph
+import tracing
 
 # Feel free to use the code below as you wish
-# Initialize it with a list/tuple of objectives
+# Initialize it with a list/tuple of objectives and a matrix of distances between them
 # Call compute_mst_weight to get the weight of the MST with those objectives
-# TODO: hint, you probably want to cache the MST value for sets of objectives you've already computed...
+# MSTHeuristic below caches the MST value for sets of objectives already computed
 class MST:
-    def __init__(self, objectives):
+    def __init__(self, objectives, distances):
         self.elements = {key: None for key in objectives}
 
-        # TODO: implement some distance between two objectives 
-        # ... either compute the shortest path between them, or just use the manhattan distance between the objectives
+        # objectives index into `distances`, e.g. the exact WaypointDistances matrix
         self.distances   = {
-                (i, j): DISTANCE(i, j)
+                (i, j): distances[i][j]
                 for i, j in self.cross(objectives)
             }
         
@@ -70,6 +80,50 @@ class MST:
     def cross(self, keys):
         return (x for y in (((i, j) for j in keys if i < j) for i in keys) for x in y)
 
+class MSTHeuristic:
+    """
+    Memoizes MST weights for sets of objectives, encoded as integer bitmasks where bit i
+    is set if objective i (an index into `distances`) is in the set. Weights are kept in
+    a least-recently-used cache of at most `maxsize` entries.
+    """
+    def __init__(self, distances, maxsize = 1 << 16):
+        self.distances  = distances
+        self.weight     = lru_cache(maxsize = maxsize)(self.compute_mst_weight)
+
+    def compute_mst_weight(self, objectives):
+        return MST([i for i in range(len(self.distances)) if objectives >> i & 1], 
+            self.distances).compute_mst_weight()
+
+    def estimate(self, curr, remaining):
+        """Lower bound on the length of a path from objective `curr` through every 
+        objective in the bitmask `remaining`"""
+        if not remaining:
+            return 0
+        return min(self.distances[curr][i] for i in range(len(self.distances)) 
+            if remaining >> i & 1) + self.weight(remaining)
+
+    @property
+    def hits(self):
+        return self.weight.cache_info().hits
+
+    @property
+    def misses(self):
+        return self.weight.cache_info().misses
+
+def trace_path(maze, prev, start, curr):
+    """
+    Walks a parent array back from flat cell index `curr` to `start`.
+
+    @return path: a list of (row, col) tuples from start to curr
+    """
+    path = []
+    while (curr != start):
+        path.append(maze.cell(curr))
+        curr = prev[curr]
+    path.append(maze.cell(curr))
+    path.reverse()
+    return path
+
 def bfs(maze):
     """
     Runs BFS for part 1 of the assignment.
@@ -78,115 +132,544 @@ def bfs(maze):
 
     @return path: a list of tuples containing the coordinates of each state in the computed path
     """
-    path = []
-    curr = maze.start
-    waypoints = maze.waypoints
-    prev = {}
-    visited = set()
-    visited.add(curr)
+    start = maze.index( * maze.start )
+    goal = maze.index( * maze.waypoints[0] )
+    curr = start
 
-    if (curr == waypoints[0]):
-        path.append(curr)
-        return path
+    if (curr == goal):
+        return [maze.cell(curr)]
 
-    queue = []
+    # cells are marked when first queued, so the bitmap doubles as the frontier membership test
+    prev = array('i', [-1]) * (maze.size.x * maze.size.y)
+    visited = bytearray(maze.size.x * maze.size.y)
+    visited[curr] = 1
+
+    queue = deque()
     queue.append(curr)
 
     while (queue):
-        curr = queue.pop(0)
-        if (curr == waypoints[0]):
+        curr = queue.popleft()
+        if (curr == goal):
             break
 
-        curr_neighbors = maze.neighbors(curr[0], curr[1])
-
-        for neighbor in curr_neighbors:
-            if (neighbor not in visited) and (neighbor not in queue):
+        for neighbor in maze.flat_neighbors(curr):
+            if not visited[neighbor]:
                 prev[neighbor] = curr
                 queue.append(neighbor)
-                visited.add(neighbor)
+                visited[neighbor] = 1
 
-    while (curr != maze.start):
-        path.append(curr)
-        curr = prev[curr]
-    path.append(curr)
-    path.reverse()
-    return path
+    return trace_path(maze, prev, start, curr)
 
 def manhattan_dist(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
-def astar_single(maze):
+def astar_single(maze, field = None):
     """
     Runs A star for part 2 of the assignment.
 
     @param maze: The maze to execute the search on.
+    @param field: Optional (rows, columns) array of exact distances to the objective,
+        e.g. from distances.distance_fields, used as the heuristic instead of the 
+        manhattan distance.
 
     @return path: a list of tuples containing the coordinates of each state in the computed path
     """
-    path = []
-    curr = maze.start
-    waypoints = maze.waypoints
-    prev = {}
-    visited = set()
-    visited.add(curr)
+    start = maze.index( * maze.start )
+    goal = maze.index( * maze.waypoints[0] )
+    goal_cell = maze.waypoints[0]
+    curr = start
+    if field is None:
+        heuristic = lambda x: manhattan_dist(maze.cell(x), goal_cell)
+    else:
+        heuristic = field.ravel().tolist().__getitem__
     steps = 1
 
-    if (curr == waypoints[0]):
-        path.append(curr)
-        return path
+    if (curr == goal):
+        return [maze.cell(curr)]
 
-    queue = []
+    prev = array('i', [-1]) * (maze.size.x * maze.size.y)
+    visited = bytearray(maze.size.x * maze.size.y)
+    visited[curr] = 1
 
-    curr_neighbors = maze.neighbors(curr[0], curr[1])
+    queue = []
 
-    for neighbor in curr_neighbors:
-        if (neighbor not in visited) and (neighbor not in queue):
+    for neighbor in maze.flat_neighbors(curr):
+        if not visited[neighbor]:
             prev[neighbor] = curr
-            heapq.heappush(queue, (manhattan_dist(neighbor, waypoints[0])+steps, steps, neighbor))
-            visited.add(neighbor)
+            heapq.heappush(queue, (heuristic(neighbor)+steps, steps, neighbor))
+            visited[neighbor] = 1
 
     while queue:
         pop = heapq.heappop(queue)
         curr = pop[2]
         curr_steps = pop[1]
 
-        if (curr == waypoints[0]):
+        if (curr == goal):
             break
 
-        curr_neighbors = maze.neighbors(curr[0], curr[1])
+        for neighbor in maze.flat_neighbors(curr):
+            if not visited[neighbor]:
+                prev[neighbor] = curr
+                heapq.heappush(queue, (heuristic(neighbor)+curr_steps, curr_steps+1, neighbor))
+                visited[neighbor] = 1
+
+    return trace_path(maze, prev, start, curr)
+
+# Jump point search on the 4-connected grid. Bits 0-3 of a cell's adjacency mask are the 
+# moves down, up, right and left (see maze.py); the pruning rules follow the orthogonal 
+# variant of JPS, where horizontal jumps stop at forced neighbors and vertical jumps stop 
+# wherever a horizontal jump would find something
+def jump(maze, curr, bit, goal):
+    """
+    Jumps from flat cell index `curr` in the direction of adjacency bit `bit`.
+
+    @return the next jump point in that direction, or -1 if there is none
+    """
+    adjacency = maze.adjacency
+    offset = (maze.size.x, -maze.size.x, 1, -1)[bit]
+    vertical = bit < 2
+    while adjacency[curr] >> bit & 1:
+        prev = curr
+        curr += offset
+        if curr == goal:
+            return curr
+        if vertical:
+            if jump(maze, curr, 2, goal) >= 0 or jump(maze, curr, 3, goal) >= 0:
+                return curr
+        else:
+            # a vertical neighbor is forced if it is open here but was blocked one step back
+            forced = adjacency[curr] & ~adjacency[prev] & 3
+            if forced:
+                return curr
+    return -1
+
+def jps(maze):
+    """
+    Runs jump point search on a single objective. Finds the same path length as
+    astar_single, but only jump points count as explored states.
+
+    @param maze: The maze to execute the search on.
 
-        for neighbor in curr_neighbors:
-            if (neighbor not in visited) and (neighbor not in queue):
+    @return path: a list of tuples containing the coordinates of each state in the computed path
+    """
+    start = maze.index( * maze.start )
+    goal = maze.index( * maze.waypoints[0] )
+    goal_cell = maze.waypoints[0]
+    width = maze.size.x
+
+    if (start == goal):
+        return [maze.cell(start)]
+
+    # directions worth jumping in given the direction a jump point was entered from
+    directions = ((0, 2, 3), (1, 2, 3), (2, 0, 1), (3, 0, 1), (0, 1, 2, 3))
+    g = {start: 0}
+    prev = {start: start}
+    entered = {start: 4}
+    queue = [(manhattan_dist(maze.start, goal_cell), 0, start)]
+    curr = start
+
+    while queue:
+        _, curr_g, curr = heapq.heappop(queue)
+        if curr_g > g[curr]:
+            continue
+        if (curr == goal):
+            break
+
+        # expanding a jump point counts as one explored state, same as a call to `neighbors`
+        maze.states_explored += 1
+        for bit in directions[entered[curr]]:
+            neighbor = jump(maze, curr, bit, goal)
+            if neighbor < 0:
+                continue
+            if bit < 2:
+                neighbor_g = curr_g + abs(neighbor - curr) // width
+            else:
+                neighbor_g = curr_g + abs(neighbor - curr)
+            if neighbor_g < g.get(neighbor, neighbor_g + 1):
+                g[neighbor] = neighbor_g
                 prev[neighbor] = curr
-                heapq.heappush(queue, (manhattan_dist(neighbor, waypoints[0])+curr_steps, curr_steps+1, neighbor))
-                visited.add(neighbor)
+                entered[neighbor] = bit
+                heapq.heappush(queue, (neighbor_g + manhattan_dist(maze.cell(neighbor), goal_cell), neighbor_g, neighbor))
 
-    while curr != maze.start:
-        path.append(curr)
-        curr = prev[curr]
-    path.append(curr)
+    # fill in the straight runs between consecutive jump points
+    path = []
+    while (curr != start):
+        parent = prev[curr]
+        if abs(curr - parent) < width:
+            step = 1 if parent < curr else -1
+        else:
+            step = width if parent < curr else -width
+        while (curr != parent):
+            path.append(maze.cell(curr))
+            curr -= step
+    path.append(maze.cell(curr))
     path.reverse()
     return path
 
-def astar_multiple(maze):
+# astar_corridor only contracts mazes where at least this fraction of the navigable cells
+# are corridor cells; in more open mazes nearly every cell becomes a node, and building
+# the graph costs far more than searching the cells directly
+CORRIDOR_RATIO = 0.5
+
+def astar_corridor(maze, graph = None):
+    """
+    Runs A star for a single objective over the maze contracted into junctions and
+    corridors, so only junctions, dead ends, the start and the waypoints are explored.
+    Without a prebuilt graph, mazes below CORRIDOR_RATIO are searched with astar_single.
+
+    @param maze: The maze to execute the search on.
+    @param graph: The maze's CorridorGraph, built if not given (e.g. kept for repeat queries).
+
+    @return path: a list of tuples containing the coordinates of each state in the computed path
+    """
+    if graph is None:
+        if corridor_ratio(maze) < CORRIDOR_RATIO:
+            return astar_single(maze)
+        graph = CorridorGraph(maze)
+    return graph.astar(maze.start, maze.waypoints[0])
+
+def hpa(maze, graph = None):
+    """
+    Runs hierarchical A* for a single objective: the search runs over the cluster-level
+    abstract graph, and only the clusters along its result are searched cell by cell.
+    The path is not guaranteed to be the shortest.
+
+    @param maze: The maze to execute the search on.
+    @param graph: The maze's ClusterGraph, built if not given (e.g. loaded from disk
+        with hierarchy.cache_path for repeat queries).
+
+    @return path: a list of tuples containing the coordinates of each state in the computed path
+    """
+    if graph is None:
+        graph = ClusterGraph(maze)
+    return graph.astar(maze.start, maze.waypoints[0])
+
+# astar_multiple may hand off to held_karp for waypoint counts in this range; below it both
+# take milliseconds, above it the DP table no longer fits in memory
+HELD_KARP_WAYPOINTS = range(12, 21)
+# an A* expansion over n objectives takes about as long as filling this many times n * n
+# entries of the DP table, as the MST heuristic and the neighbors both grow with n
+HELD_KARP_ENTRIES   = 8
+
+def held_karp_budget(n):
+    """
+    Returns the number of A* expansions over `n` objectives (the start and the waypoints)
+    that take about as long as filling the Held-Karp table. astar_multiple hands off to
+    held_karp once it has made this many expansions without reaching the goal.
+    """
+    k = n - 1
+    return k * (1 << (k - 1)) // (HELD_KARP_ENTRIES * n * n)
+
+def held_karp(maze, waypoints = None):
+    """
+    Runs the Held-Karp dynamic program over the waypoint distance matrix, for an exact
+    shortest path from the start through every waypoint. Like tour, the table is filled
+    from the distance matrix rather than by exploring states, so it does not count toward
+    `maze.states_explored`.
+
+    @param maze: The maze to execute the search on.
+    @param waypoints: The maze's WaypointDistances, computed if not given.
+
+    @return path: a list of tuples containing the coordinates of each state in the computed path
+    """
+    if waypoints is None:
+        with tracing.phase('distances'):
+            waypoints = WaypointDistances(maze)
+    k = len(waypoints) - 1
+    if k == 0:
+        return [maze.start]
+
+    # cost[mask, j] is the length of the shortest path from the start through the waypoints
+    # in `mask` that ends at waypoint j, and parent[mask, j] the waypoint visited before j
+    infinity = np.int64(1) << 40
+    distances = np.where(waypoints.distances < 0, infinity, waypoints.distances)
+    from_start = distances[0, 1:]
+    between = distances[1:, 1:]
+    cost = np.full((1 << k, k), infinity, dtype = np.int64)
+    parent = np.full((1 << k, k), -1, dtype = np.int8)
+    bits = 1 << np.arange(k)
+    cost[bits, np.arange(k)] = from_start
+
+    masks = np.arange(1 << k)
+    popcount = np.zeros(1 << k, dtype = np.int8)
+    for bit in bits:
+        popcount += (masks & bit) != 0
+
+    with tracing.phase('table'):
+        for size in range(2, k + 1):
+            layer = masks[popcount == size]
+            for j in range(k):
+                targets = layer[(layer & bits[j]) != 0]
+                candidates = cost[targets ^ bits[j]] + between[:, j]
+                parent[targets, j] = candidates.argmin(axis = 1)
+                cost[targets, j] = candidates[np.arange(len(targets)), parent[targets, j]]
+
+    last = int(cost[-1].argmin())
+    if cost[-1, last] >= infinity:
+        return []
+
+    order = []
+    mask = (1 << k) - 1
+    while last >= 0:
+        order.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    order.append(0)
+    order.reverse()
+    return waypoints.stitch(order)
+
+def astar_multiple(maze, waypoints = None):
     """
     Runs A star for part 3 of the assignment in the case where there are
-    multiple objectives.
+    multiple objectives. For waypoint counts in HELD_KARP_WAYPOINTS, a search that runs
+    past held_karp_budget expansions is finished with held_karp instead, keeping the
+    states it explored so far.
 
     @param maze: The maze to execute the search on.
+    @param waypoints: The maze's WaypointDistances, computed if not given.
 
     @return path: a list of tuples containing the coordinates of each state in the computed path
     """
-    return []
+    if waypoints is None:
+        with tracing.phase('distances'):
+            waypoints = WaypointDistances(maze)
+    # states are (last objective reached, bitmask of objectives left), where objective 0 
+    # is the start and objective i > 0 is waypoint i - 1; edges are exact shortest paths
+    distances = waypoints.distances.tolist()
+    n = len(waypoints)
+    heuristic = MSTHeuristic(distances).estimate
+    budget = held_karp_budget(n) if len(maze.waypoints) in HELD_KARP_WAYPOINTS else None
+
+    start = (0, (1 << n) - 2)
+    g = {start: 0}
+    prev = {start: None}
+    queue = [(heuristic( * start ), 0, start)]
+    expanded = 0
 
-def fast(maze):
+    while queue:
+        _, curr_g, curr = heapq.heappop(queue)
+        if curr_g > g[curr]:
+            continue
+        if not curr[1]:
+            break
+        if expanded == budget:
+            return held_karp(maze, waypoints)
+        expanded += 1
+
+        # expanding a state counts as one explored state, same as a call to `neighbors`
+        maze.states_explored += 1
+        position, remaining = curr
+        for i in range(1, n):
+            if remaining >> i & 1 and distances[position][i] >= 0:
+                neighbor = (i, remaining & ~(1 << i))
+                neighbor_g = curr_g + distances[position][i]
+                if neighbor_g < g.get(neighbor, neighbor_g + 1):
+                    g[neighbor] = neighbor_g
+                    prev[neighbor] = curr
+                    heapq.heappush(queue, (neighbor_g + heuristic( * neighbor ), neighbor_g, neighbor))
+    else:
+        return []
+
+    order = []
+    while curr is not None:
+        order.append(curr[0])
+        curr = prev[curr]
+    order.reverse()
+    return waypoints.stitch(order)
+
+def nearest_neighbor_tour(distances):
+    """
+    Builds an open tour over a square distance matrix, starting at index 0 and
+    always moving to the closest index not yet visited.
+
+    @return tour: a numpy array of indices
+    """
+    n = len(distances)
+    tour = np.zeros(n, dtype = np.int64)
+    visited = np.zeros(n, dtype = bool)
+    visited[0] = True
+    for k in range(1, n):
+        row = np.where(visited, np.iinfo(np.int64).max, distances[tour[k - 1]])
+        tour[k] = row.argmin()
+        visited[tour[k]] = True
+    return tour
+
+def two_opt(distances, tour):
     """
-    Runs suboptimal search algorithm for part 4.
+    Shortens an open tour that starts at tour[0] by reversing segments, until no 
+    reversal helps. `distances` must have an extra last row and column of zeros, 
+    standing for the free end of the tour.
+
+    @return tour: the improved tour, with the end index still appended
+    """
+    n = len(tour) - 1
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            # gain of reversing tour[i:j + 1] for every j at once
+            j = np.arange(i + 1, n)
+            delta = (distances[tour[i - 1], tour[j]] + distances[tour[i], tour[j + 1]] 
+                - distances[tour[i - 1], tour[i]] - distances[tour[j], tour[j + 1]])
+            best = delta.argmin()
+            if delta[best] < 0:
+                tour[i:j[best] + 1] = tour[i:j[best] + 1][::-1].copy()
+                improved = True
+    return tour
+
+def or_opt(distances, tour, lengths = (1, 2, 3)):
+    """
+    Shortens an open tour that starts at tour[0] by moving runs of up to three
+    consecutive indices, possibly reversed, elsewhere in the tour, until no move helps. 
+    `distances` must have an extra last row and column of zeros, as in two_opt.
+
+    @return tour: the improved tour, with the end index still appended
+    """
+    n = len(tour) - 1
+    improved = True
+    while improved:
+        improved = False
+        for length in lengths:
+            for i in range(1, n - length + 1):
+                e = i + length - 1
+                first, last = tour[i], tour[e]
+                removed = (distances[tour[i - 1], first] + distances[last, tour[e + 1]] 
+                    - distances[tour[i - 1], tour[e + 1]])
+                # cost of inserting the run between tour[k] and tour[k + 1], for every k at once
+                k = np.concatenate((np.arange(0, i - 1), np.arange(e + 1, n)))
+                if len(k) == 0:
+                    continue
+                edge = distances[tour[k], tour[k + 1]]
+                forward = distances[tour[k], first] + distances[last, tour[k + 1]] - edge
+                backward = distances[tour[k], last] + distances[first, tour[k + 1]] - edge
+                best = np.minimum(forward, backward).argmin()
+                if min(forward[best], backward[best]) < removed:
+                    run = tour[i:e + 1].copy()
+                    if backward[best] < forward[best]:
+                        run = run[::-1]
+                    rest = np.concatenate((tour[:i], tour[e + 1:]))
+                    # position of the insertion edge once the run has been taken out
+                    at = k[best] + 1 if k[best] < i else k[best] + 1 - length
+                    tour[:] = np.concatenate((rest[:at], run, rest[at:]))
+                    improved = True
+    return tour
+
+def tour(maze, waypoints = None):
+    """
+    Builds a near-optimal path through every waypoint for mazes with many waypoints:
+    a nearest-neighbor tour over the waypoint distance matrix, improved with 2-opt and
+    Or-opt moves. Does not explore any states itself.
 
     @param maze: The maze to execute the search on.
+    @param waypoints: The maze's WaypointDistances, computed if not given.
 
     @return path: a list of tuples containing the coordinates of each state in the computed path
     """
-    return []
-    
-            
+    if waypoints is None:
+        with tracing.phase('distances'):
+            waypoints = WaypointDistances(maze)
+    if (waypoints.distances[0] < 0).any():
+        return []
+
+    # the last row and column stand for the free end of the tour, at distance 0 from everything
+    n = len(waypoints)
+    distances = np.zeros((n + 1, n + 1), dtype = np.int64)
+    distances[:n, :n] = waypoints.distances
+    order = np.append(nearest_neighbor_tour(waypoints.distances), n)
+
+    # alternate the two until neither improves the tour
+    length = None
+    with tracing.phase('improve'):
+        while length is None or distances[order[:-1], order[1:]].sum() < length:
+            length = distances[order[:-1], order[1:]].sum()
+            order = or_opt(distances, two_opt(distances, order))
+    return waypoints.stitch(order[:-1].tolist())
+
+# defaults for fast(): seconds to search for, the suboptimality bound to stop at, and
+# the inflation the first search starts from and how much it drops per iteration
+FAST_BUDGET     = 10.0
+FAST_EPSILON    = 1.2
+FAST_INITIAL    = 3.0
+FAST_STEP       = 0.5
+
+def fast(maze, budget = FAST_BUDGET, epsilon = FAST_EPSILON, waypoints = None):
+    """
+    Runs suboptimal search algorithm for part 4: anytime repairing A* (ARA*) over the
+    same (last objective, remaining objectives) states as astar_multiple. A fast search
+    with a heavily inflated heuristic finds a first path, then the inflation is lowered
+    towards `epsilon` and the search repaired, reusing earlier work, until the path is 
+    within `epsilon` of optimal or `budget` seconds have passed. The first path is always 
+    returned, even if finding it takes longer than the budget.
+
+    @param maze: The maze to execute the search on.
+    @param budget: Time budget in seconds.
+    @param epsilon: Suboptimality bound to stop at.
+    @param waypoints: The maze's WaypointDistances, computed if not given.
+
+    @return path: a list of tuples containing the coordinates of each state in the computed path
+    """
+    deadline = time.perf_counter() + budget
+    if waypoints is None:
+        with tracing.phase('distances'):
+            waypoints = WaypointDistances(maze)
+    distances = waypoints.distances.tolist()
+    n = len(waypoints)
+    heuristic = MSTHeuristic(distances).estimate
+
+    start = (0, (1 << n) - 2)
+    weight = max(FAST_INITIAL, epsilon)
+    g = {start: 0}
+    prev = {start: None}
+    best, best_g = None, float('inf')
+    queue = [(weight * heuristic( * start ), 0, start)]
+    closed = set()
+    inconsistent = set()
+
+    while True:
+        # expand until no state in the queue can lead to a path shorter than the best one
+        while queue and queue[0][0] < best_g:
+            if best is not None and time.perf_counter() > deadline:
+                break
+            _, curr_g, curr = heapq.heappop(queue)
+            if curr_g > g[curr] or curr in closed:
+                continue
+            closed.add(curr)
+
+            # expanding a state counts as one explored state, same as a call to `neighbors`
+            maze.states_explored += 1
+            position, remaining = curr
+            for i in range(1, n):
+                if remaining >> i & 1 and distances[position][i] >= 0:
+                    neighbor = (i, remaining & ~(1 << i))
+                    neighbor_g = curr_g + distances[position][i]
+                    if neighbor_g < g.get(neighbor, neighbor_g + 1):
+                        g[neighbor] = neighbor_g
+                        prev[neighbor] = curr
+                        if not neighbor[1]:
+                            if neighbor_g < best_g:
+                                best, best_g = neighbor, neighbor_g
+                        elif neighbor in closed:
+                            inconsistent.add(neighbor)
+                        else:
+                            heapq.heappush(queue, (neighbor_g + weight * heuristic( * neighbor ), neighbor_g, neighbor))
+
+        if weight <= epsilon or time.perf_counter() > deadline or not (queue or inconsistent):
+            break
+
+        # lower the inflation and requeue every open or inconsistent state under it
+        weight = max(epsilon, weight - FAST_STEP)
+        pending = inconsistent.union(curr for _, curr_g, curr in queue 
+            if curr_g == g[curr] and curr not in closed)
+        queue = [(g[curr] + weight * heuristic( * curr ), g[curr], curr) for curr in pending]
+        heapq.heapify(queue)
+        closed = set()
+        inconsistent = set()
+
+    if best is None:
+        return []
+
+    order = []
+    while best is not None:
+        order.append(best[0])
+        best = prev[best]
+    order.reverse()
+    return waypoints.stitch(order)
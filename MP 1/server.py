@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# server.py
+# ---------------
+# Long-lived MP1 solver daemon. Clients connect over a Unix socket or localhost TCP
+# and send one JSON query per line, e.g.
+#
+#   {"id": 1, "maze": "data/part-1/open", "search": "astar_single"}
+#
+# and get back one JSON line per query (in completion order, so queries carry an id)
+# with the path, its length, states explored and solve time, or an error.
+#
+# Queries are solved in a pool of worker processes. Every worker keeps an LRU of parsed
+# mazes and their precomputed waypoint distances (and cluster and corridor graphs),
+# keyed by a hash of the maze file, so repeat queries against the same mazes skip
+# parsing and preprocessing. The same per-case work as main.py is done otherwise.
+
+import argparse, asyncio, hashlib, json, multiprocessing, os, socket, stat, time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from contraction import CorridorGraph, corridor_ratio
+from distances import WaypointDistances
+from hierarchy import ClusterGraph, cache_path
+from maze import Maze
+import search
+
+SOLUTIONS   = ('bfs', 'astar_single', 'astar_corridor', 'jps', 'hpa', 'fast', 'astar_multiple', 'tour')
+# number of mazes each worker keeps parsed
+MAZES       = 8
+PORT        = 8440
+
+class MazeCache:
+    """
+    LRU of the `capacity` most recently used mazes, keyed by the hash of their file.
+    Each entry is a dictionary holding the parsed `maze`, the `path` it was loaded from
+    and any precomputed `waypoints` (WaypointDistances), `graph` (ClusterGraph, also
+    saved next to the maze file) or `corridors` (CorridorGraph, or None if the maze is
+    searched without contraction).
+    """
+    def __init__(self, capacity = MAZES):
+        self.capacity   = capacity
+        self._entries   = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, digest, path):
+        """Returns the entry of the maze at `path` with file hash `digest`, loading it if needed"""
+        if digest in self._entries:
+            self._entries.move_to_end(digest)
+        else:
+            self._entries[digest] = {'maze': Maze(path), 'path': path}
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last = False)
+        return self._entries[digest]
+
+def solve(entry, solution):
+    """
+    Runs `solution` on the maze of a MazeCache entry, reusing its precomputed data.
+    Queries already run in parallel across the server's workers, so the precomputation
+    runs in the worker itself.
+    """
+    maze = entry['maze']
+    maze.states_explored = 0
+    time_start = time.perf_counter()
+    if solution in ('astar_multiple', 'fast', 'tour'):
+        if 'waypoints' not in entry:
+            entry['waypoints'] = WaypointDistances(maze, workers = 1)
+        path = getattr(search, solution)(maze, waypoints = entry['waypoints'])
+    elif solution == 'astar_corridor':
+        if 'corridors' not in entry:
+            entry['corridors'] = CorridorGraph(maze) \
+                if corridor_ratio(maze) >= search.CORRIDOR_RATIO else None
+        path = search.astar_corridor(maze, entry['corridors'])
+    elif solution == 'hpa':
+        if 'graph' not in entry:
+            entry['graph'] = ClusterGraph(maze, cache = cache_path(entry['path']), workers = 1)
+        path = search.hpa(maze, entry['graph'])
+    else:
+        path = getattr(search, solution)(maze)
+    return {
+        'path'              : [list(x) for x in path],
+        'length'            : len(path),
+        'states_explored'   : maze.states_explored,
+        'time'              : time.perf_counter() - time_start,
+    }
+
+# every worker process keeps its own cache, created by the pool initializer
+_worker_mazes = None
+
+def _initialize_worker(capacity):
+    global _worker_mazes
+    _worker_mazes = MazeCache(capacity)
+
+def _solve_worker(digest, path, solution):
+    # any failure is sent back as an error, since the client waits for a reply to every query
+    try:
+        return solve(_worker_mazes.get(digest, path), solution)
+    except Exception as error:
+        return {'error': '{0}: {1}'.format(type(error).__name__, error)}
+
+class Server:
+    """
+    Answers JSON queries with `workers` solver processes (defaults to the number of
+    cpus), each caching up to `mazes` mazes.
+    """
+    def __init__(self, workers = None, mazes = MAZES):
+        # workers are started from a fork server, since workers forked straight from this
+        # process would inherit client sockets and keep them open after they are closed here
+        self.pool       = ProcessPoolExecutor(max_workers = workers, initializer = _initialize_worker,
+            initargs = (mazes,), mp_context = multiprocessing.get_context('forkserver'))
+        # file hashes, keyed by path and invalidated when the file's stat changes
+        self._digests   = {}
+
+    def digest(self, path):
+        """Returns the hash of the file at `path`, rereading it only if it has changed"""
+        status  = os.stat(path)
+        key     = (status.st_ino, status.st_size, status.st_mtime_ns)
+        if self._digests.get(path, (None,))[0] != key:
+            with open(path, 'rb') as file:
+                self._digests[path] = (key, hashlib.sha1(file.read()).hexdigest())
+        return self._digests[path][1]
+
+    async def answer(self, line):
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError('query must be a JSON object')
+        except ValueError as error:
+            return {'error': 'ValueError: {0}'.format(error)}
+
+        result = {'id': query.get('id')}
+        solution = query.get('search', 'bfs')
+        if solution not in SOLUTIONS:
+            result['error'] = 'unknown search method \'{0}\''.format(solution)
+            return result
+        try:
+            path = os.path.abspath(query['maze'])
+            digest = self.digest(path)
+        except (KeyError, TypeError, OSError) as error:
+            result['error'] = '{0}: {1}'.format(type(error).__name__, error)
+            return result
+        try:
+            result.update(await asyncio.get_running_loop().run_in_executor(self.pool, _solve_worker,
+                digest, path, solution))
+        except Exception as error:
+            # e.g. the worker died, or its result could not be sent back
+            result['error'] = '{0}: {1}'.format(type(error).__name__, error)
+        return result
+
+    async def handle(self, reader, writer):
+        # queries on one connection are solved concurrently and answered as they finish
+        async def respond(line):
+            result = await self.answer(line)
+            writer.write((json.dumps(result) + '\n').encode())
+            await writer.drain()
+
+        pending = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(respond(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.wait(pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, unix = None, host = '127.0.0.1', port = PORT):
+        if unix is not None:
+            # a socket left behind by a server that did not shut down cleanly
+            if os.path.exists(unix) and stat.S_ISSOCK(os.stat(unix).st_mode):
+                os.unlink(unix)
+            server = await asyncio.start_unix_server(self.handle, path = unix)
+        else:
+            server = await asyncio.start_server(self.handle, host = host, port = port)
+        async with server:
+            await server.serve_forever()
+
+def query(queries, unix = None, host = '127.0.0.1', port = PORT):
+    """
+    Sends each query dictionary in `queries` to a running server and waits for all
+    the answers.
+
+    @return a list of result dictionaries, in the order the queries were given
+    """
+    if unix is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(unix)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection:
+        queries = [dict(query, id = k) for k, query in enumerate(queries)]
+        connection.sendall(''.join(json.dumps(query) + '\n' for query in queries).encode())
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('r') as lines:
+            results = [json.loads(line) for line in lines]
+    return sorted(results, key = lambda result: result['id'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description     = 'CS440 MP1 solver server',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--unix', dest = 'unix', type = str, default = None,
+                        help = 'Unix socket path (listens on localhost TCP if omitted)')
+    parser.add_argument('--port', dest = 'port', type = int, default = PORT,
+                        help = 'localhost TCP port')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    serve_parser = commands.add_parser('serve', help = 'run the server',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    serve_parser.add_argument('--workers', dest = 'workers', type = int, default = None,
+                        help = 'number of worker processes (defaults to the number of cpus)')
+    serve_parser.add_argument('--mazes', dest = 'mazes', type = int, default = MAZES,
+                        help = 'number of mazes each worker keeps cached')
+
+    query_parser = commands.add_parser('query', help = 'send queries to a running server and print the answers',
+        formatter_class = argparse.ArgumentDefaultsHelpFormatter)
+    query_parser.add_argument('paths', nargs = '+',
+                        help = 'paths to maze files')
+    query_parser.add_argument('--search', dest = 'search', type = str, default = 'bfs',
+                        choices = SOLUTIONS,
+                        help = 'search method')
+
+    arguments = parser.parse_args()
+    if arguments.command == 'serve':
+        try:
+            asyncio.run(Server(arguments.workers, arguments.mazes).serve(arguments.unix, port = arguments.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        results = query(({'maze': os.path.abspath(path), 'search': arguments.search} for path in arguments.paths),
+            arguments.unix, port = arguments.port)
+        for path, result in zip(arguments.paths, results):
+            result.pop('path', None)
+            print(path, json.dumps(result))
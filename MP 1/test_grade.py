@@ -0,0 +1,72 @@
+# test_grade.py
+# ---------------
+# Tests for the autograder's case runner. Run with `python -m pytest` or
+# `python -m unittest` from this directory.
+
+import multiprocessing, os, signal, tempfile, time, unittest
+from unittest import mock
+
+import bench
+import grade
+import search
+
+def swallowing(maze):
+    # a solver that catches every Exception and keeps going
+    while True:
+        try:
+            time.sleep(0.01)
+        except Exception:
+            pass
+
+def unresponsive(maze):
+    # a solver that never sees the alarm, as if stuck in C code
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(60)
+
+class RunCasesTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        # keep the distance cache of the case processes out of the user's cache
+        environment = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(self.directory, 'cache')})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def maze(self, waypoints):
+        filepath = os.path.join(self.directory, 'maze-{0}'.format(waypoints))
+        with open(filepath, 'w') as file:
+            file.write('\n'.join(bench.generate(41, 0.2, waypoints, 0)))
+        return filepath
+
+    def run_case(self, solution, waypoints = 1, limit = 60):
+        outcome, = grade.run_cases(({'case': self.maze(waypoints)},), (solution,), workers = 1, limit = limit)[0].values()
+        return outcome
+
+    def test_many_waypoints(self):
+        # at 16 or more waypoints the distances are computed in a process pool, which
+        # the case processes must be able to start
+        outcome = self.run_case('astar_multiple', waypoints = 16)
+        self.assertIsNone(outcome['error'])
+        self.assertIsNone(outcome['validity'])
+        self.assertGreater(outcome['length'], 0)
+        self.assertTrue(os.listdir(os.path.join(self.directory, 'cache', 'mp1')))
+
+    # the case processes are forked, so they see the solvers patched into `search`
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'case processes are not forked')
+    def test_timeout_not_swallowed(self):
+        with mock.patch.object(search, 'swallowing', swallowing, create = True):
+            outcome = self.run_case('swallowing', limit = 0.2)
+        self.assertEqual(outcome['error'], 'timed out after 0.2 seconds')
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'case processes are not forked')
+    def test_unresponsive_case_killed(self):
+        with mock.patch.object(search, 'unresponsive', unresponsive, create = True), \
+                mock.patch.object(grade, 'CASE_GRACE', 0.2):
+            time_start = time.perf_counter()
+            outcome = self.run_case('unresponsive', limit = 0.2)
+        self.assertEqual(outcome['error'], 'timed out after 0.2 seconds')
+        self.assertLess(time.perf_counter() - time_start, 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# tracing.py
+# ---------------
+# Optional instrumentation for the MP1 solvers. While a Tracer is active it records
+# the order cells are expanded in, the frontier size after every expansion, heap
+# push and pop counts, pushes of states that were already pushed before, and the time
+# spent in each solver phase, and it can write all of it to a compact binary file
+# that `main.py --replay` animates as a heat map.
+#
+# Nothing in the solvers changes while no Tracer is active: the Tracer swaps in
+# counting versions of the maze's neighbor functions, of the `heapq` and `deque` that
+# search.py uses and of the `heapq` of the graphs in contraction.py and hierarchy.py,
+# and puts the originals back when it exits. The only hook left in the solvers is
+# `phase`, which is entered once per phase, not once per state.
+
+import contextlib, struct, time
+from array import array
+from collections import deque
+
+MAGIC   = b'MP1TRACE'
+VERSION = 1
+# magic, version, rows, columns, expansions, pushes, pops, duplicate pushes, phases
+HEADER  = struct.Struct('<8sIIIIQQQI')
+
+# the active Tracer, if any
+_active = None
+_NULL   = contextlib.nullcontext()
+
+def phase(name):
+    """Returns a context manager that times solver phase `name` if a Tracer is active,
+    and does nothing otherwise"""
+    return _NULL if _active is None else _active.phase(name)
+
+class Trace:
+    """
+    Results of a traced search. `expansions[k]` is the flat index of the k-th cell
+    expanded and `frontier[k]` the frontier size right after it; `phases` maps each
+    phase name to its total time in seconds.
+    """
+    def __init__(self, rows, columns, expansions = None, frontier = None, pushes = 0, pops = 0,
+            duplicates = 0, phases = None):
+        self.rows       = rows
+        self.columns    = columns
+        self.expansions = array('i') if expansions is None else expansions
+        self.frontier   = array('i') if frontier is None else frontier
+        self.pushes     = pushes
+        self.pops       = pops
+        self.duplicates = duplicates
+        self.phases     = {} if phases is None else phases
+
+    @property
+    def duplicate_ratio(self):
+        """Fraction of pushes that pushed a state which had been pushed before"""
+        return self.duplicates / max(1, self.pushes)
+
+    def save(self, path):
+        """Writes the trace to `path`"""
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.rows, self.columns, len(self.expansions),
+                self.pushes, self.pops, self.duplicates, len(self.phases)))
+            for name, seconds in self.phases.items():
+                name = name.encode()
+                file.write(struct.pack('<H', len(name)) + name + struct.pack('<d', seconds))
+            file.write(self.expansions.tobytes())
+            file.write(self.frontier.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """Reads a trace written by `save`"""
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, rows, columns, n, pushes, pops, duplicates, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('\'{0}\' is not a version {1} MP1 trace'.format(path, VERSION))
+
+        offset = HEADER.size
+        phases = {}
+        for _ in range(count):
+            length, = struct.unpack_from('<H', data, offset)
+            name = data[offset + 2:offset + 2 + length].decode()
+            phases[name], = struct.unpack_from('<d', data, offset + 2 + length)
+            offset += 2 + length + 8
+        expansions, frontier = array('i'), array('i')
+        expansions.frombytes(data[offset:offset + 4 * n])
+        frontier.frombytes(data[offset + 4 * n:offset + 8 * n])
+        return cls(rows, columns, expansions, frontier, pushes, pops, duplicates, phases)
+
+class Tracer:
+    """
+    Context manager that traces every search.py solver run on `maze` inside it, e.g.
+
+        with Tracer(maze) as tracer:
+            path = search.astar_single(maze)
+        tracer.trace.save('astar_single.trace')
+
+    A state counts as expanded when it leaves a frontier, or when its neighbors are
+    generated right after that. Multi-objective states (objective, remaining
+    objectives) are drawn at the cell of their objective, in the order of
+    WaypointDistances (the start, then the waypoints), and the nodes of CorridorGraph
+    and ClusterGraph searches at their cells.
+    """
+    def __init__(self, maze):
+        self.maze   = maze
+        self.trace  = Trace(maze.size.y, maze.size.x)
+        self.cells  = tuple(maze.index( * x ) for x in (maze.start,) + tuple(maze.waypoints))
+        self._pushed    = set()
+        self._frontier  = 0
+        self._last      = None
+        # maps the states of the graph search running, if any, to their cells
+        self._cell_of   = None
+
+    def __enter__(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError('a Tracer is already active')
+        _active = self
+
+        # search.py imports this module for `phase`
+        import contraction, hierarchy, search
+        tracer  = self
+        heapq   = search.heapq
+        class CountingDeque(deque):
+            def append(self, item):
+                tracer._push(item, len(self) + 1)
+                deque.append(self, item)
+
+            def popleft(self):
+                item = deque.popleft(self)
+                tracer._pop(item, len(self))
+                return item
+
+        class CountingHeapq:
+            @staticmethod
+            def heappush(queue, item):
+                tracer._push(item, len(queue) + 1)
+                heapq.heappush(queue, item)
+
+            @staticmethod
+            def heappop(queue):
+                item = heapq.heappop(queue)
+                tracer._pop(item, len(queue))
+                return item
+
+            @staticmethod
+            def heapify(queue):
+                heapq.heapify(queue)
+                tracer._frontier = len(queue)
+
+        neighbors, flat_neighbors = self.maze.neighbors, self.maze.flat_neighbors
+        def traced_neighbors(i, j):
+            self._expand(self.maze.index(i, j))
+            return neighbors(i, j)
+
+        def traced_flat_neighbors(index):
+            self._expand(index)
+            return flat_neighbors(index)
+
+        def mapped(method, cell_of):
+            # runs a graph method with its states mapped to cells by cell_of(graph, * args )
+            def traced(graph, * args ):
+                saved = tracer._cell_of
+                tracer._cell_of = cell_of(graph, * args )
+                try:
+                    return method(graph, * args )
+                finally:
+                    tracer._cell_of = saved
+            return traced
+
+        def cluster_cells(graph, source, target):
+            # the source and target are abstract nodes -1 and -2
+            ends = {-1: graph.maze.index( * source ), -2: graph.maze.index( * target )}
+            return lambda u: ends[u] if u < 0 else int(graph.nodes[u])
+
+        corridor, cluster = contraction.CorridorGraph, hierarchy.ClusterGraph
+        self._restore = tuple((owner, name, getattr(owner, name)) for owner, name in (
+            (search, 'heapq'), (search, 'deque'), (contraction, 'heapq'), (hierarchy, 'heapq'),
+            (corridor, 'astar'), (cluster, 'astar'), (cluster, '_refine')))
+        search.heapq, search.deque = CountingHeapq, CountingDeque
+        contraction.heapq = hierarchy.heapq = CountingHeapq
+        corridor.astar  = mapped(corridor.astar, lambda graph, source, target: graph.nodes.__getitem__)
+        cluster.astar   = mapped(cluster.astar, cluster_cells)
+        # refinement searches cells directly
+        cluster._refine = mapped(cluster._refine, lambda graph, source, target: int)
+        self.maze.neighbors, self.maze.flat_neighbors = traced_neighbors, traced_flat_neighbors
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, * exception ):
+        global _active
+        self.trace.phases['total'] = self.trace.phases.get('total', 0) + time.perf_counter() - self._start
+        for owner, name, original in self._restore:
+            setattr(owner, name, original)
+        del self.maze.neighbors, self.maze.flat_neighbors
+        _active = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.trace.phases[name] = self.trace.phases.get(name, 0) + time.perf_counter() - start
+
+    def _state(self, item):
+        # frontier items are either states or (priority, g, state, ...) tuples; states are
+        # keyed along with the graph search they belong to, if any
+        state = item[2] if type(item) is tuple and len(item) > 2 else item
+        if self._cell_of is not None:
+            return (self._cell_of, state), self._cell_of(state)
+        if type(state) is tuple:
+            return state, self.cells[state[0]]
+        return state, state
+
+    def _push(self, item, size):
+        state, _ = self._state(item)
+        self.trace.pushes  += 1
+        if state in self._pushed:
+            self.trace.duplicates += 1
+        else:
+            self._pushed.add(state)
+        self._frontier = size
+
+    def _pop(self, item, size):
+        state, cell = self._state(item)
+        self.trace.pops    += 1
+        self._frontier = size
+        self._expand(state, cell)
+
+    def _expand(self, state, cell = None):
+        # generating the neighbors of the state that was just popped is the same expansion
+        if state == self._last:
+            return
+        self._last = state
+        self.trace.expansions.append(state if cell is None else cell)
+        self.trace.frontier.append(self._frontier)
@@ -16,6 +16,12 @@ import math
 import numpy as np
 from numpy.core.numeric import isclose
 from alien import Alien
+from wallindex import WallIndex
+
+# at most this many (configuration, wall) pairs are tested at once by the grid functions
+GRID_PAIRS = 1 << 22
+# side of the blocks of configurations that query a WallIndex together in the grid functions
+GRID_TILE = 16
 
 def dist_line_line(line1X1, line1Y1, line1X2, line1Y2, line2X1, line2Y1, line2X2, line2Y2):
     changeX1 = line1X2 - line1X1
@@ -64,13 +70,19 @@ def does_alien_touch_wall(alien, walls,granularity):
 
         Args:
             alien (Alien): Instance of Alien class that will be navigating our map
-            walls (list): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endx), ...]
+            walls (list): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endx), ...], or a WallIndex over them
             granularity (int): The granularity of the map
 
         Return:
             True if touched, False if not
     """
 
+    if isinstance(walls, WallIndex):
+        head, tail = alien.get_head_and_tail()
+        reach = touch_reach(alien, granularity)
+        walls = walls.query(min(head[0], tail[0]) - reach, min(head[1], tail[1]) - reach,
+                            max(head[0], tail[0]) + reach, max(head[1], tail[1]) + reach)
+
     buffer = granularity / np.sqrt(2)
     for wall in walls:
         wallX1 = wall[0]
@@ -93,6 +105,17 @@ def does_alien_touch_wall(alien, walls,granularity):
 
     return False
 
+def touch_reach(alien, granularity):
+    """Returns a distance from the alien's line segment beyond which does_alien_touch_wall
+    never finds a wall, including the tolerance of its np.isclose test
+
+        Args:
+            alien (Alien): Instance of Alien class that will be navigating our map
+            granularity (int): The granularity of the map
+    """
+    buffer = granularity / np.sqrt(2)
+    return alien.get_width() + buffer + 1e-5 * abs(buffer) + 1e-6
+
 def does_alien_touch_goal(alien, goals):
     """Determine whether the alien touches a goal
         
@@ -216,6 +239,183 @@ def is_alien_within_window(alien, window,granularity):
 
     return True
 
+def dist_point_line_array(pointX, pointY, lineX1, lineY1, lineX2, lineY2):
+    """Same as dist_point_line, for arrays of points and lines that are broadcast against each other
+    """
+    changeX = lineX2 - lineX1
+    changeY = lineY2 - lineY1
+    mag = changeX * changeX + changeY * changeY
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        changeSlope = ((pointX - lineX1) * changeX + (pointY - lineY1) * changeY) / mag
+
+    # a point on a degenerate line measures from its first endpoint, as if before the line
+    before = (changeSlope < 0) | ((changeX == 0) & (changeY == 0))
+    after = changeSlope > 1
+    changeX, changeY = (
+        np.where(before, pointX - lineX1, np.where(after, pointX - lineX2, pointX - lineX1 - (changeSlope * changeX))),
+        np.where(before, pointY - lineY1, np.where(after, pointY - lineY2, pointY - lineY1 - (changeSlope * changeY))))
+    return np.hypot(changeX, changeY)
+
+def dist_line_line_array(line1X1, line1Y1, line1X2, line1Y2, line2X1, line2Y1, line2X2, line2Y2):
+    """Same as dist_line_line, for arrays of line pairs that are broadcast against each other
+    """
+    changeX1 = line1X2 - line1X1
+    changeY1 = line1Y2 - line1Y1
+    changeX2 = line2X2 - line2X1
+    changeY2 = line2Y2 - line2Y1
+    offset = changeX2 * changeY1 - changeY2 * changeX1
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        a = (changeX1 * (line2Y1 - line1Y1) + changeY1 * (line1X1 - line2X1)) / offset
+        b = (changeX2 * (line1Y1 - line2Y1) + changeY2 * (line2X1 - line1X1)) / (-offset)
+    crossing = (offset != 0) & (0 <= a) & (a <= 1) & (0 <= b) & (b <= 1)
+
+    dist = np.minimum(
+        np.minimum(dist_point_line_array(line1X1, line1Y1, line2X1, line2Y1, line2X2, line2Y2),
+                   dist_point_line_array(line1X2, line1Y2, line2X1, line2Y1, line2X2, line2Y2)),
+        np.minimum(dist_point_line_array(line2X1, line2Y1, line1X1, line1Y1, line1X2, line1Y2),
+                   dist_point_line_array(line2X2, line2Y2, line1X1, line1Y1, line1X2, line1Y2)))
+    return np.where(crossing, 0, dist)
+
+def alien_grid(alien, xs, ys):
+    """Places the alien, in its current shape, at every centroid (xs[i], ys[j]) of a grid
+
+        Args:
+            alien (Alien): Alien instance, only its shape is used
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+
+        Return:
+            (alienX, alienY, head, tail): the centroids, head and tail coordinates as
+            (len(xs), len(ys)) float arrays, head and tail as (x, y) pairs of such arrays
+    """
+    alienX, alienY = np.meshgrid(np.asarray(xs, dtype = np.float64), np.asarray(ys, dtype = np.float64), indexing = 'ij')
+    # same as Alien.get_head_and_tail
+    half = alien.get_length() / 2
+    if (alien.get_shape() == 'Horizontal'):
+        return alienX, alienY, (alienX + half, alienY), (alienX - half, alienY)
+    elif (alien.get_shape() == 'Vertical'):
+        return alienX, alienY, (alienX, alienY - half), (alienX, alienY + half)
+    return alienX, alienY, (alienX, alienY), (alienX, alienY)
+
+def does_alien_touch_wall_grid(alien, xs, ys, walls, granularity):
+    """Same as does_alien_touch_wall, for the alien in its current shape at every centroid of a grid
+
+        Args:
+            alien (Alien): Alien instance, only its shape is used
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+            walls (list): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endx), ...], or a WallIndex over them
+            granularity (int): The granularity of the map
+
+        Return:
+            (len(xs), len(ys)) boolean array, True where the alien touches a wall
+    """
+    alienX, alienY, (alienHeadX, alienHeadY), (alienTailX, alienTailY) = alien_grid(alien, xs, ys)
+    touched = np.zeros(alienX.shape, dtype = bool)
+    if not len(walls) or not touched.size:
+        return touched
+
+    if isinstance(walls, WallIndex):
+        # each tile of the grid is only tested against the walls near it
+        reach = touch_reach(alien, granularity)
+        for i in range(0, len(xs), GRID_TILE):
+            for j in range(0, len(ys), GRID_TILE):
+                tile = (slice(i, i + GRID_TILE), slice(j, j + GRID_TILE))
+                near = walls.query(
+                    min(alienHeadX[tile].min(), alienTailX[tile].min()) - reach,
+                    min(alienHeadY[tile].min(), alienTailY[tile].min()) - reach,
+                    max(alienHeadX[tile].max(), alienTailX[tile].max()) + reach,
+                    max(alienHeadY[tile].max(), alienTailY[tile].max()) + reach)
+                touched[tile] = does_alien_touch_wall_grid(alien, xs[i:i + GRID_TILE], ys[j:j + GRID_TILE], near, granularity)
+        return touched
+
+    buffer = granularity / np.sqrt(2)
+    alienRad = alien.get_width()
+    # configurations along the first axis and walls along the second, a chunk of walls at a time
+    alienX, alienY = alienX.reshape(-1, 1), alienY.reshape(-1, 1)
+    alienHeadX, alienHeadY = alienHeadX.reshape(-1, 1), alienHeadY.reshape(-1, 1)
+    alienTailX, alienTailY = alienTailX.reshape(-1, 1), alienTailY.reshape(-1, 1)
+    walls = np.asarray(walls, dtype = np.float64).reshape(-1, 4)
+    chunk = max(1, GRID_PAIRS // touched.size)
+    for start in range(0, len(walls), chunk):
+        wallX1, wallY1, wallX2, wallY2 = walls[start:start + chunk].T
+        if (alien.is_circle()): # circle alien case
+            dist = dist_point_line_array(alienX, alienY, wallX1, wallY1, wallX2, wallY2) - alienRad
+        else: # oblong alien case
+            dist = dist_line_line_array(alienHeadX, alienHeadY, alienTailX, alienTailY, wallX1, wallY1, wallX2, wallY2) - alienRad
+        touched |= ((dist < buffer) | np.isclose(dist, buffer)).any(axis = 1).reshape(touched.shape)
+    return touched
+
+def does_alien_touch_goal_grid(alien, xs, ys, goals):
+    """Same as does_alien_touch_goal, for the alien in its current shape at every centroid of a grid
+
+        Args:
+            alien (Alien): Alien instance, only its shape is used
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+            goals (list): x, y coordinate and radius of goals in the format [(x, y, r), ...]. There can be multiple goals
+
+        Return:
+            (len(xs), len(ys)) boolean array, True where the alien touches a goal
+    """
+    alienX, alienY, (alienHeadX, alienHeadY), (alienTailX, alienTailY) = alien_grid(alien, xs, ys)
+    alienRad = alien.get_width()
+    touched = np.zeros(alienX.shape, dtype = bool)
+    for goal in goals:
+        goalX = goal[0]
+        goalY = goal[1]
+        goalRad = goal[2]
+        if (alien.is_circle()): # circle alien case
+            finalDist = np.sqrt((alienX - goalX) ** 2 + (alienY - goalY) ** 2)
+        else: # oblong alien case
+            distHead = np.sqrt((alienHeadX - goalX) ** 2 + (alienHeadY - goalY) ** 2)
+            distTail = np.sqrt((alienTailX - goalX) ** 2 + (alienTailY - goalY) ** 2)
+            minDistEnds = np.minimum(distHead, distTail)
+            finalDist = minDistEnds
+            # vertical, with the goal beside the segment
+            beside = (alienHeadX == alienTailX) & np.where(alienHeadY > alienTailY,
+                (goalY >= alienTailY) & (goalY <= alienHeadY), (goalY >= alienHeadY) & (goalY <= alienTailY))
+            finalDist = np.where(beside, np.minimum(abs(goalX - alienX), minDistEnds), finalDist)
+            # horizontal, with the goal above or below the segment
+            beside = (alienHeadY == alienTailY) & np.where(alienHeadX > alienTailX,
+                (goalX >= alienTailX) & (goalX <= alienHeadX), (goalX > alienHeadX) & (goalX < alienTailX))
+            finalDist = np.where(beside, np.minimum(abs(goalY - alienY), minDistEnds), finalDist)
+        touched |= (finalDist < (alienRad + goalRad)) | np.isclose(finalDist, (alienRad + goalRad))
+    return touched
+
+def is_alien_within_window_grid(alien, xs, ys, window, granularity):
+    """Same as is_alien_within_window, for the alien in its current shape at every centroid of a grid
+
+        Args:
+            alien (Alien): Alien instance, only its shape is used
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+            window (tuple): (width, height) of the window
+            granularity (int): The granularity of the map
+
+        Return:
+            (len(xs), len(ys)) boolean array, True where the alien stays within the window
+    """
+    alienX, alienY, (alienHeadX, alienHeadY), (alienTailX, alienTailY) = alien_grid(alien, xs, ys)
+    width = window[0]
+    height = window[1]
+    buffer = granularity / np.sqrt(2)
+    xLowerBound = buffer
+    yLowerBound = buffer
+    xUpperBound = width - buffer
+    yUpperBound = height - buffer
+    alienRad = alien.get_width()
+    # extents of the alien along each axis, circles take the vertical branch since head and tail coincide
+    vertical = alienHeadX == alienTailX
+    lowX = np.where(vertical, alienX, np.where(alienHeadX > alienTailX, alienTailX, alienHeadX)) - alienRad
+    highX = np.where(vertical, alienX, np.where(alienHeadX > alienTailX, alienHeadX, alienTailX)) + alienRad
+    lowY = np.where(vertical, np.where(alienHeadY > alienTailY, alienTailY, alienHeadY), alienY) - alienRad
+    highY = np.where(vertical, np.where(alienHeadY > alienTailY, alienHeadY, alienTailY), alienY) + alienRad
+    return ~((lowX < xLowerBound) | np.isclose(lowX, xLowerBound) |
+             (highX > xUpperBound) | np.isclose(highX, xUpperBound) |
+             (lowY < yLowerBound) | np.isclose(lowY, yLowerBound) |
+             (highY > yUpperBound) | np.isclose(highY, yUpperBound))
+
 if __name__ == '__main__':
     #Walls, goals, and aliens taken from Test1 map
     walls =   [(0,100,100,100),  
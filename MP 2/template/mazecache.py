@@ -0,0 +1,86 @@
+# mazecache.py
+# ---------------
+# Persistent on-disk cache of generated MP2 configuration-space mazes. Each maze is
+# stored as a .npy array of character codes, which is loaded memory-mapped, next to
+# a .json file describing what it was generated from. Entries are keyed by a hash of
+# that description: the map's walls, goals and window, the alien's shapes, lengths,
+# widths and start configuration, the granularity and backend, and the source of the
+# modules that generate mazes, so editing geometry.py invalidates every entry.
+
+import copy, hashlib, json, os
+
+import numpy as np
+
+# bump whenever the stored layout changes so stale entries are ignored
+FORMAT_VERSION  = 1
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'mazes')
+# modules whose source the generated mazes depend on
+SOURCES         = ('alien.py', 'const.py', 'geometry.py', 'raster.py', 'transform.py', 'util.py', 'wallindex.py')
+
+def source_hash():
+    """Returns a hex digest of the source of the modules in SOURCES"""
+    digest = hashlib.sha1()
+    for name in SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+def describe(alien, goals, walls, window, granularity, backend):
+    """Returns a dictionary of everything the maze generated by transformToMaze from
+    these arguments depends on, as JSON values"""
+    shapeAlien = copy.copy(alien)
+    lengths = []
+    widths  = []
+    for shape in alien.get_shapes():
+        shapeAlien.set_alien_config((0, 0, shape))
+        lengths.append(shapeAlien.get_length())
+        widths.append(shapeAlien.get_width())
+    return {
+        'version'       : FORMAT_VERSION,
+        'source'        : source_hash(),
+        'walls'         : [list(wall) for wall in walls],
+        'goals'         : [list(goal) for goal in goals],
+        'window'        : list(window),
+        'shapes'        : list(alien.get_shapes()),
+        'lengths'       : lengths,
+        'widths'        : widths,
+        'start'         : list(alien.get_config()),
+        'limits'        : [list(limit) for limit in alien.get_alien_limits()],
+        'granularity'   : granularity,
+        'backend'       : backend,
+    }
+
+def cache_path(directory, description):
+    """Returns the path, without extension, of the entry for `description` in `directory`"""
+    return os.path.join(directory, hashlib.sha1(json.dumps(description, sort_keys = True).encode()).hexdigest())
+
+def load(directory, description, shape):
+    """
+    Returns the cached maze for `description`, as a memory-mapped uint8 array of `shape`
+    holding its character codes, or None if it is not cached.
+    """
+    path = cache_path(directory, description)
+    try:
+        with open(path + '.json') as file:
+            if json.load(file) != description:
+                return None
+        codes = np.load(path + '.npy', mmap_mode = 'r')
+    except (OSError, ValueError):
+        return None
+    return codes if codes.dtype == np.uint8 and codes.shape == tuple(shape) else None
+
+def save(directory, description, codes):
+    """Stores the uint8 array of character codes of the maze for `description`"""
+    path = cache_path(directory, description)
+    try:
+        os.makedirs(directory, exist_ok = True)
+        # write to temporary files first so concurrent runs never read a partial entry
+        temporary = '.{0}.tmp'.format(os.getpid())
+        with open(path + '.npy' + temporary, 'wb') as file:
+            np.save(file, np.ascontiguousarray(codes, dtype = np.uint8))
+        with open(path + '.json' + temporary, 'w') as file:
+            json.dump(description, file, sort_keys = True)
+        os.replace(path + '.npy' + temporary, path + '.npy')
+        os.replace(path + '.json' + temporary, path + '.json')
+    except OSError:
+        pass
@@ -19,11 +19,13 @@ import copy
 
 from pygame.locals import *
 from alien import Alien
-from transform import transformToMaze
+from transform import BACKENDS, transformToMaze
+from mazecache import CACHE_DIRECTORY
 from search import search
 from const import *
 from util import *
 from geometry import *
+from wallindex import WallIndex
 import time
 
 class Application:
@@ -51,6 +53,7 @@ class Application:
 		self.obstacles = eval(self.config.get(map_name, 'Obstacles'))
 		boundary = [(0,0,0,lims[1]),(0,0,lims[0],0),(lims[0],0,lims[0],lims[1]),(0,lims[1],lims[0],lims[1])]
 		self.obstacles.extend(boundary)
+		self.wall_index = WallIndex(self.obstacles)
 		self.goals = eval(self.config.get(map_name, 'Goals'))
 		self.alien_color = BLACK
 		self.alien = Alien(self.centroid,self.lengths,self.widths,self.alien_shapes,self.alien_shape,self.window)
@@ -67,14 +70,14 @@ class Application:
 		self.running = True
 
 	def get_alien_color(self):
-		if does_alien_touch_wall(self.alien, self.obstacles,self.granularity) or not is_alien_within_window(self.alien, self.window,self.granularity):
+		if does_alien_touch_wall(self.alien, self.wall_index,self.granularity) or not is_alien_within_window(self.alien, self.window,self.granularity):
 			self.alien_color = RED
 		elif does_alien_touch_goal(self.alien,self.goals):
 			self.alien_color = GREEN
 		else: 
 			self.alien_color = BLACK
 	# Once the application is initiated, execute is in charge of drawing the game and dealing with the game loop
-	def execute(self, searchMethod, granularity, trajectory, saveMaze):    
+	def execute(self, searchMethod, granularity, trajectory, saveMaze, backend='geometry', workers=1, cache=None):    
 		self.granularity = granularity    
 		self.initialize()
 		if not self.running:
@@ -88,7 +91,7 @@ class Application:
 
 		if not self.__human:
 			print("Transforming a map configuration to a maze...")
-			maze = transformToMaze(self.alien, self.goals, self.obstacles, self.window, granularity)
+			maze = transformToMaze(self.alien, self.goals, self.obstacles, self.window, granularity, backend, workers, cache)
 			print("Done!")
 			print("Searching the path...")
 			path = search(maze, searchMethod)
@@ -251,9 +254,17 @@ if __name__ == "__main__":
 						help='degree granularity - default '+str(DEFAULT_GRANULARITY))
 	parser.add_argument('--trajectory', dest="trajectory", type=int, default = 0, 
 						help='leave footprint of rotation trajectory in every x moves - default 0')
+	parser.add_argument('--backend', dest="backend", type=str, default = "geometry",
+						choices = BACKENDS,
+						help='maze construction backend - default geometry')
+	parser.add_argument('--workers', dest="workers", type=int, default = 1,
+						help='number of worker processes building the maze, 0 for the number of cpus - default 1')
+	parser.add_argument('--no-cache', dest="noCache", default = False, action = "store_true",
+						help='rebuild the maze instead of reusing a cached one - default False')
 	parser.add_argument('--save-maze', dest="saveMaze", type=str, default = None, 
 						help='save the contructed maze to maze file - default not saved')
 	
 	args = parser.parse_args()
 	app = Application(args.configfile, args.map_name, args.human, args.fps)
-	app.execute(args.search, args.granularity, args.trajectory, args.saveMaze)
+	app.execute(args.search, args.granularity, args.trajectory, args.saveMaze, args.backend, args.workers,
+		None if args.noCache else CACHE_DIRECTORY)
@@ -0,0 +1,107 @@
+# raster.py
+# ---------------
+# Raster backend for building MP2 configuration-space mazes. Within a shape level the
+# alien only translates, so the configurations touching a wall are the walls dilated
+# by the alien's footprint: a disk for the ball and a stadium for the oblong shapes,
+# grown by the same granularity / sqrt(2) buffer as the geometric predicates (and
+# likewise for goals, without the buffer). Walls and goal centers are rasterized on
+# a grid `oversample` times finer than the maze, and dilated with an FFT convolution,
+# so the cost grows with the map's area rather than its number of walls. Positions
+# are snapped to the raster, and the footprints are grown by the most that can move
+# them, so every configuration the exact predicates find touching a wall or goal is
+# found touching it here too. Configurations within about a raster cell of a wall or
+# goal boundary may also be found touching it when they are not, so goal
+# configurations close to a wall can become walls, and a coarse maze can be left
+# without any objective.
+
+import math
+import numpy as np
+
+from geometry import alien_grid, dist_point_line_array, touch_reach
+
+# raster cells per maze cell along each axis
+OVERSAMPLE = 2
+# the most, in raster cells, that rasterizing moves a point of a wall: wall points are
+# at most a quarter cell from a sample along the wall, which snaps by up to half a cell
+# along each axis
+WALL_SNAP = 0.25 + math.sqrt(0.5)
+# goal centers are rasterized directly, so they only snap
+GOAL_SNAP = math.sqrt(0.5)
+
+def footprint(alien, spacing, reach):
+    """
+    Returns the footprint of the alien in its current shape, as a boolean array over
+    raster offsets (centered on the middle element): True where a point at that offset
+    from the alien's centroid is within `reach` of the alien's line segment.
+    """
+    head, tail = alien.get_head_and_tail()
+    half = abs(head[0] - tail[0]) / 2, abs(head[1] - tail[1]) / 2
+    m, n = (int(math.ceil((extent + reach) / spacing)) for extent in half)
+    offsets = [k * spacing for k in range(-m, m + 1)], [k * spacing for k in range(-n, n + 1)]
+    # the footprint is symmetric, so measuring from the alien at each offset to the origin
+    # is the same as measuring from each offset to the alien
+    _, _, (headX, headY), (tailX, tailY) = alien_grid(alien, * offsets )
+    return dist_point_line_array(0, 0, headX, headY, tailX, tailY) <= reach
+
+def rasterize(points, shape, spacing, origin):
+    """
+    Returns a float array of `shape` with 1 in the raster cells (of side `spacing`, with
+    cell (0, 0) centered on `origin`) nearest each of the (x, y) `points`, and 0 elsewhere.
+    """
+    raster = np.zeros(shape, dtype = np.float64)
+    if len(points):
+        # halves round up rather than to even, so a point snaps to the same place whatever the origin
+        cells = np.floor((np.asarray(points, dtype = np.float64).reshape(-1, 2) - origin) / spacing + 0.5).astype(np.int64)
+        inside = ((cells >= 0) & (cells < shape)).all(axis = 1)
+        raster[cells[inside, 0], cells[inside, 1]] = 1
+    return raster
+
+def sample_walls(walls, spacing):
+    """Returns an (n, 2) array of points along the walls, at most half of `spacing` apart"""
+    walls = np.asarray(walls, dtype = np.float64).reshape(-1, 4)
+    counts = np.ceil(np.hypot(walls[:, 2] - walls[:, 0], walls[:, 3] - walls[:, 1]) / spacing * 2).astype(np.int64) + 1
+    wall = np.repeat(np.arange(len(walls)), counts)
+    # position of each point along its wall, from 0 to 1
+    t = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(np.maximum(counts - 1, 1), counts)
+    return np.stack((walls[wall, 0] + t * (walls[wall, 2] - walls[wall, 0]),
+                     walls[wall, 1] + t * (walls[wall, 3] - walls[wall, 1])), axis = 1)
+
+def dilate(raster, kernel):
+    """Returns a boolean array of the raster's shape, True where the kernel (centered on its
+    middle element) overlaps a nonzero raster cell"""
+    shape = tuple(a + b - 1 for a, b in zip(raster.shape, kernel.shape))
+    overlap = np.fft.irfft2(np.fft.rfft2(raster, shape) * np.fft.rfft2(kernel.astype(np.float64), shape), shape)
+    m, n = kernel.shape[0] // 2, kernel.shape[1] // 2
+    return overlap[m:m + raster.shape[0], n:n + raster.shape[1]] > 0.5
+
+def _level(alien, xs, ys, kernel, points, granularity, oversample):
+    # raster cells of the maze's configurations are every `oversample`-th cell, after a
+    # margin of half the kernel so points just outside the grid are still counted
+    spacing = granularity / oversample
+    margin = np.array(kernel.shape) // 2
+    shape = tuple((len(axis) - 1) * oversample + 1 + 2 * k for axis, k in zip((xs, ys), margin))
+    origin = np.array((xs[0], ys[0]), dtype = np.float64) - margin * spacing
+    mask = dilate(rasterize(points, shape, spacing, origin), kernel)
+    return mask[margin[0]::oversample, margin[1]::oversample][:len(xs), :len(ys)]
+
+def does_alien_touch_wall_raster(alien, xs, ys, walls, granularity, oversample = OVERSAMPLE):
+    """Approximates does_alien_touch_wall_grid from above (never False where it is True),
+    for grids whose xs and ys are evenly spaced `granularity` apart"""
+    spacing = granularity / oversample
+    reach = touch_reach(alien, granularity) + WALL_SNAP * spacing
+    return _level(alien, xs, ys, footprint(alien, spacing, reach), sample_walls(walls, spacing),
+        granularity, oversample)
+
+def does_alien_touch_goal_raster(alien, xs, ys, goals, granularity, oversample = OVERSAMPLE):
+    """Approximates does_alien_touch_goal_grid from above (never False where it is True),
+    for grids whose xs and ys are evenly spaced `granularity` apart"""
+    spacing = granularity / oversample
+    touched = np.zeros((len(xs), len(ys)), dtype = bool)
+    # goals of the same radius share a footprint
+    for radius in sorted(set(goal[2] for goal in goals)):
+        reach = alien.get_width() + radius
+        # with the tolerance of the np.isclose test of does_alien_touch_goal
+        reach += 1e-5 * reach + 1e-6 + GOAL_SNAP * spacing
+        touched |= _level(alien, xs, ys, footprint(alien, spacing, reach),
+            [goal[:2] for goal in goals if goal[2] == radius], granularity, oversample)
+    return touched
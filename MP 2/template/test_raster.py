@@ -0,0 +1,62 @@
+# test_raster.py
+# ---------------
+# Tests for the raster backend of MP2 maze construction. Run with `python -m pytest`
+# or `python -m unittest` from this directory.
+
+import configparser, copy, os, unittest
+
+import numpy as np
+
+from alien import Alien
+from geometry import does_alien_touch_goal_grid, does_alien_touch_wall_grid
+from raster import does_alien_touch_goal_raster, does_alien_touch_wall_raster
+from transform import transformLevel
+from const import WALL_CHAR
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'maps', 'test_config.txt')
+# the maps and granularities of the test mazes
+MAP_NAMES = ('Test1', 'Test2', 'Test3', 'Test4', 'NoSolutionMap')
+GRANULARITIES = (2, 5, 8, 10)
+
+def load_map(config, map_name):
+    """Returns the alien, goals, walls (with the window boundary) and window of a map"""
+    window = eval(config.get(map_name, 'Window'))
+    centroid = eval(config.get(map_name, 'StartPoint'))
+    widths = eval(config.get(map_name, 'Widths'))
+    lengths = eval(config.get(map_name, 'Lengths'))
+    obstacles = eval(config.get(map_name, 'Obstacles'))
+    obstacles.extend([(0,0,0,window[1]),(0,0,window[0],0),(window[0],0,window[0],window[1]),(0,window[1],window[0],window[1])])
+    goals = eval(config.get(map_name, 'Goals'))
+    alien = Alien(centroid, lengths, widths, ['Horizontal','Ball','Vertical'], 'Ball', window)
+    return alien, goals, obstacles, window
+
+class RasterTest(unittest.TestCase):
+    def levels(self):
+        # every shape level of the test mazes
+        config = configparser.ConfigParser()
+        config.read(CONFIG_FILE)
+        for map_name in MAP_NAMES:
+            alien, goals, walls, window = load_map(config, map_name)
+            xlimit, ylimit = alien.get_alien_limits()[:2]
+            for granularity in GRANULARITIES:
+                xs = np.arange(xlimit[0], xlimit[1] + 1, granularity)
+                ys = np.arange(ylimit[0], ylimit[1] + 1, granularity)
+                for shape in alien.get_shapes():
+                    shapeAlien = copy.copy(alien)
+                    shapeAlien.set_alien_config((0, 0, shape))
+                    yield (map_name, granularity, shape), shapeAlien, goals, walls, window, granularity, xs, ys
+
+    def test_conservative(self):
+        for case, alien, goals, walls, window, granularity, xs, ys in self.levels():
+            with self.subTest(case = case):
+                touchWall = does_alien_touch_wall_grid(alien, xs, ys, walls, granularity)
+                touchGoal = does_alien_touch_goal_grid(alien, xs, ys, goals)
+                self.assertFalse((touchWall & ~does_alien_touch_wall_raster(alien, xs, ys, walls, granularity)).any())
+                self.assertFalse((touchGoal & ~does_alien_touch_goal_raster(alien, xs, ys, goals, granularity)).any())
+
+                exact = transformLevel(alien, goals, walls, window, granularity, xs, ys) == ord(WALL_CHAR)
+                approximate = transformLevel(alien, goals, walls, window, granularity, xs, ys, 'raster') == ord(WALL_CHAR)
+                self.assertFalse((exact & ~approximate).any())
+
+if __name__ == '__main__':
+    unittest.main()
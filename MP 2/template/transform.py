@@ -17,14 +17,110 @@ import copy
 from maze import Maze
 from search import *
 from geometry import *
+from wallindex import WallIndex
+from raster import does_alien_touch_goal_raster, does_alien_touch_wall_raster
+import mazecache
 from const import *
 from util import *
 import os
 
 import traceback
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
-def transformToMaze(alien, goals, walls, window,granularity):
+BACKENDS = ('geometry', 'raster')
+
+def transformLevel(alien, goals, walls, window, granularity, xs, ys, backend='geometry'):
+    """This function computes one shape level of the maze over a grid of centroids.
+
+        Args:
+            alien (Alien): alien instance in the shape of the level, its position is ignored
+            goals (list): [(x, y, r)] of goals
+            walls (list): [(startx, starty, endx, endy)] of walls, or a WallIndex over them for the geometry backend
+            window (tuple): (width, height) of the window
+            granularity (int): The granularity of the map
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+            backend (str): one of BACKENDS
+
+        Return:
+            (len(xs), len(ys)) uint8 array of the maze characters of the level, as character codes
+    """
+    if backend == 'raster':
+        touchGoal = does_alien_touch_goal_raster(alien, xs, ys, goals, granularity)
+        touchWall = does_alien_touch_wall_raster(alien, xs, ys, walls, granularity)
+    else:
+        touchGoal = does_alien_touch_goal_grid(alien, xs, ys, goals)
+        touchWall = does_alien_touch_wall_grid(alien, xs, ys, walls, granularity)
+    level = np.full((len(xs), len(ys)), ord(SPACE_CHAR), dtype=np.uint8)
+    level[touchGoal] = ord(OBJECTIVE_CHAR)
+    level[touchWall | ~is_alien_within_window_grid(alien, xs, ys, window, granularity)] = ord(WALL_CHAR)
+    return level
+
+# process pool workers receive the map, and attach to the shared maze buffer, once through the initializer
+_worker_map = None
+
+def _initialize_worker(name, mazedim, alien, goals, walls, window, granularity, xs, ys, backend):
+    global _worker_map
+    buffer = shared_memory.SharedMemory(name=name)
+    codes = np.ndarray(mazedim, dtype=np.uint8, buffer=buffer.buf)
+    if backend == 'geometry':
+        walls = WallIndex(walls)
+    _worker_map = (buffer, codes, alien, goals, walls, window, granularity, xs, ys, backend)
+
+def _shard_worker(shard):
+    buffer, codes, alien, goals, walls, window, granularity, xs, ys, backend = _worker_map
+    z, x0, x1 = shard
+    alien.set_alien_config((0, 0, alien.get_shapes()[z]))
+    codes[x0:x1, :, z] = transformLevel(alien, goals, walls, window, granularity, xs[x0:x1], ys, backend)
+
+def transformLevels(alien, goals, walls, window, granularity, xs, ys, levels, backend='geometry', workers=1):
+    """This function computes the first `levels` shape levels of the maze over a grid of centroids.
+
+        Args:
+            alien (Alien): alien instance, its configuration is left unchanged
+            goals (list): [(x, y, r)] of goals
+            walls (list): [(startx, starty, endx, endy)] of walls
+            window (tuple): (width, height) of the window
+            granularity (int): The granularity of the map
+            xs (list): x coordinates of the grid
+            ys (list): y coordinates of the grid
+            levels (int): number of shape levels
+            backend (str): one of BACKENDS
+            workers (int): number of worker processes, each building slabs of x coordinates
+                of a shape level into a shared maze buffer (the number of cpus if 0 or None)
+
+        Return:
+            (len(xs), len(ys), levels) uint8 array of the maze characters, as character codes
+    """
+    rows = len(xs)
+    mazedim = (rows, len(ys), levels)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        codes = np.empty(mazedim, dtype=np.uint8)
+        # a copy of the alien takes each shape, so the caller's alien keeps its configuration
+        shapeAlien = copy.copy(alien)
+        levelWalls = WallIndex(walls) if backend == 'geometry' else walls
+        for z in range(levels):
+            shapeAlien.set_alien_config((0, 0, alien.get_shapes()[z]))
+            codes[:, :, z] = transformLevel(shapeAlien, goals, levelWalls, window, granularity, xs, ys, backend)
+        return codes
+
+    # every worker gets its own copy of the alien with the rest of the map
+    slab = max(1, -(-rows // workers))
+    shards = [(z, x0, min(x0 + slab, rows)) for z in range(levels) for x0 in range(0, rows, slab)]
+    buffer = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(mazedim))))
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                initargs=(buffer.name, mazedim, alien, goals, walls, window, granularity, xs, ys, backend)) as pool:
+            list(pool.map(_shard_worker, shards))
+        return np.ndarray(mazedim, dtype=np.uint8, buffer=buffer.buf).copy()
+    finally:
+        buffer.close()
+        buffer.unlink()
+
+def transformToMaze(alien, goals, walls, window,granularity, backend='geometry', workers=1, cache=None):
     """This function transforms the given 2D map to the maze in MP1.
     
         Args:
@@ -32,11 +128,20 @@ def transformToMaze(alien, goals, walls, window,granularity):
             goals (list): [(x, y, r)] of goals
             walls (list): [(startx, starty, endx, endy)] of walls
             window (tuple): (width, height) of the window
+            backend (str): one of BACKENDS, 'geometry' tests every configuration with the
+                exact geometric predicates, 'raster' dilates rasterized walls and goals by
+                the alien's footprint (see raster.py)
+            workers (int): number of worker processes, each building slabs of x coordinates
+                of a shape level into a shared maze buffer (the number of cpus if 0 or None)
+            cache (str): directory of a maze cache (see mazecache.py) to reuse a maze
+                generated from the same arguments, or to store this one (not cached if None)
 
         Return:
             Maze: the maze instance generated based on input arguments.
 
     """
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend \'{}\''.format(backend))
 
     xlimit = alien.get_alien_limits()[0]
     ylimit = alien.get_alien_limits()[1]
@@ -48,38 +153,45 @@ def transformToMaze(alien, goals, walls, window,granularity):
     startAlienConfig = alien.get_config()
     startidx = configToIdx(startAlienConfig, tuple((0,0,0)), granularity, alien)
 
-    mazeMap = np.full(mazedim, SPACE_CHAR)
-
-    foundstart = False
-    x = 0
-    while x < rows:
-        y = 0
-        while y < cols:
-            z = 0
-            while z < levels:
-                curridx = tuple((x, y, z))
-                currAlienConfig = idxToConfig(curridx, tuple((0, 0, 0)), granularity, alien)
-                alien.set_alien_config(currAlienConfig)
-
-                if ((not foundstart) and curridx == startidx):
-                    mazeMap[x, y, z] = START_CHAR
-                    foundstart = True
-                elif (does_alien_touch_wall(alien, walls, granularity) or (not is_alien_within_window(alien, window, granularity))):
-                    mazeMap[x, y, z] = WALL_CHAR
-                elif (does_alien_touch_goal(alien, goals)):
-                    mazeMap[x, y, z] = OBJECTIVE_CHAR
-                z += 1
-            y += 1
-        x += 1
-
-    mazeOut = Maze(mazeMap, alien, granularity)
+    # every shape level is computed at once over this grid of centroids
+    xs = [idxToConfig((x, 0, 0), (0, 0, 0), granularity, alien)[0] for x in range(rows)]
+    ys = [idxToConfig((0, y, 0), (0, 0, 0), granularity, alien)[1] for y in range(cols)]
+    codes = None
+    if cache is not None:
+        description = mazecache.describe(alien, goals, walls, window, granularity, backend)
+        codes = mazecache.load(cache, description, mazedim)
+    if codes is None:
+        codes = transformLevels(alien, goals, walls, window, granularity, xs, ys, levels, backend, workers)
+        if cache is not None:
+            mazecache.save(cache, description, codes)
+
+    mazeMap = codes.view('S1').astype('U1')
+    if all(0 <= i < n for i, n in zip(startidx, mazedim)):
+        mazeMap[startidx] = START_CHAR
+
+    # nested lists, like the map of a maze read from a file, are much faster to index cell by cell
+    mazeOut = Maze(mazeMap.tolist(), alien, granularity)
     return mazeOut
 
 
 if __name__ == '__main__':
+    import argparse
     import configparser
 
-    def generate_test_mazes(granularities,map_names):
+    parser = argparse.ArgumentParser(description='CS440 MP2 test maze generation')
+    parser.add_argument('--backend', dest='backend', type=str, default='geometry', choices=BACKENDS,
+                        help='maze construction backend - default geometry')
+    parser.add_argument('--workers', dest='workers', type=int, default=1,
+                        help='number of worker processes building each maze, 0 for the number of cpus - default 1')
+    args = parser.parse_args()
+
+    # mazes from other backends are kept apart from the geometry ones, to be compared
+    # with the same ground truth
+    def maze_file(map_name,granularity,backend):
+        suffix = '' if backend == 'geometry' else '_' + backend
+        return './mazes/{}_granularity_{}{}.txt'.format(map_name,granularity,suffix)
+
+    def generate_test_mazes(granularities,map_names,backend,workers):
         for granularity in granularities:
             for map_name in map_names:
                 try:
@@ -101,16 +213,16 @@ if __name__ == '__main__':
                     obstacles.extend(boundary)
                     goals = eval(config.get(map_name, 'Goals'))
                     alien = Alien(centroid,lengths,widths,alien_shapes,alien_shape,window)
-                    generated_maze = transformToMaze(alien,goals,obstacles,window,granularity)
-                    generated_maze.saveToFile('./mazes/{}_granularity_{}.txt'.format(map_name,granularity))
+                    generated_maze = transformToMaze(alien,goals,obstacles,window,granularity,backend,workers)
+                    generated_maze.saveToFile(maze_file(map_name,granularity,backend))
                 except Exception as e:
                     print('Exception at maze {} and granularity {}: {}'.format(map_name,granularity,e))
-    def compare_test_mazes_with_gt(granularities,map_names):
+    def compare_test_mazes_with_gt(granularities,map_names,backend):
         name_dict = {'%':'walls','.':'goals',' ':'free space','P':'start'}
         shape_dict = ['Horizontal','Ball','Vertical']
         for granularity in granularities:
             for map_name in map_names:
-                this_maze_file = './mazes/{}_granularity_{}.txt'.format(map_name,granularity)
+                this_maze_file = maze_file(map_name,granularity,backend)
                 gt_maze_file = './mazes/gt_{}_granularity_{}.txt'.format(map_name,granularity)
                 if(not os.path.exists(gt_maze_file)):
                     print('no gt available for map {} at granularity {}'.format(map_name,granularity))
@@ -142,5 +254,5 @@ if __name__ == '__main__':
     ### change these to speed up your testing early on! 
     granularities = [2,5,8,10]
     map_names = ['Test1','Test2','Test3','Test4','NoSolutionMap']
-    generate_test_mazes(granularities,map_names)
-    compare_test_mazes_with_gt(granularities,map_names)
+    generate_test_mazes(granularities,map_names,args.backend,args.workers)
+    compare_test_mazes_with_gt(granularities,map_names,args.backend)
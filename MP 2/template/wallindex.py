@@ -0,0 +1,57 @@
+# wallindex.py
+# ---------------
+# Spatial index over the wall segments of an MP2 map. Walls are bucketed by their
+# bounding boxes on a uniform grid, so that a collision query only tests the walls
+# whose bounds overlap the box around the alien instead of every wall of the map.
+
+import math
+import numpy as np
+
+class WallIndex:
+    """
+    Uniform grid of square buckets of side `bucket` over walls given as
+    (startx, starty, endx, endy) segments, where each wall is listed in every bucket
+    its bounding box overlaps. If `bucket` is not given, it is picked so there are
+    about as many buckets as walls.
+    """
+    def __init__(self, walls, bucket = None):
+        self.walls  = [tuple(wall) for wall in walls]
+        bounds      = np.asarray(self.walls, dtype = np.float64).reshape(-1, 4)
+        self.low    = np.minimum(bounds[:, :2], bounds[:, 2:])
+        self.high   = np.maximum(bounds[:, :2], bounds[:, 2:])
+        if bucket is None:
+            extent = (self.high.max(axis = 0) - self.low.min(axis = 0)).max() if len(self.walls) else 1
+            bucket = max(1, extent / math.sqrt(max(1, len(self.walls))))
+        self.bucket = bucket
+
+        self._buckets = {}
+        for k, ((x0, y0), (x1, y1)) in enumerate(zip(self._cells(self.low), self._cells(self.high))):
+            for bx in range(x0, x1 + 1):
+                for by in range(y0, y1 + 1):
+                    self._buckets.setdefault((bx, by), []).append(k)
+        # buckets outside these bounds are empty
+        self._bounds = (self._cells(self.low).min(axis = 0), self._cells(self.high).max(axis = 0)) \
+            if len(self.walls) else None
+
+    def _cells(self, points):
+        return np.floor(np.asarray(points, dtype = np.float64) / self.bucket).astype(np.int64)
+
+    def __len__(self):
+        return len(self.walls)
+
+    def query(self, lowX, lowY, highX, highY):
+        """
+        Returns the walls whose bounding boxes overlap the box [lowX, highX] x [lowY, highY],
+        in the order they were given.
+        """
+        if self._bounds is None:
+            return []
+        (x0, y0), (x1, y1) = np.maximum(self._cells((lowX, lowY)), self._bounds[0]), \
+            np.minimum(self._cells((highX, highY)), self._bounds[1])
+        found = set()
+        for bx in range(x0, x1 + 1):
+            for by in range(y0, y1 + 1):
+                found.update(self._buckets.get((bx, by), ()))
+        return [self.walls[k] for k in sorted(found)
+            if self.low[k, 0] <= highX and lowX <= self.high[k, 0]
+            and self.low[k, 1] <= highY and lowY <= self.high[k, 1]]